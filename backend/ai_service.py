@@ -1,51 +1,277 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
 import openai
-from typing import List, Dict, Any
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import categorizer
+import local_classifier
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
 
 # Set your OpenAI API key here
 # openai.api_key = "your-api-key"
 
+# Model settings; OPENAI_BASE_URL can point at a compatible server or at
+# benchmarks/openai_stub.py for local testing
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
 
-def categorize_expense(note: str) -> str:
-    """Use AI to categorize an expense based on the note"""
+# Consecutive failed model calls after which calls stop for
+# MODEL_BREAKER_RESET_SECONDS, so an outage costs no request a timeout
+MODEL_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+MODEL_BREAKER_RESET_SECONDS = float(os.getenv("OPENAI_BREAKER_RESET_SECONDS", "60"))
+
+# Normalized notes whose category is kept in memory per process; every
+# answer from the model is also stored in the categorization_cache table
+CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", "10000"))
+
+# Distinct notes sent to the model in one request
+CATEGORIZE_BATCH_SIZE = int(os.getenv("CATEGORIZE_BATCH_SIZE", "50"))
+
+CATEGORIES = [
+    "Food", "Transport", "Housing", "Utilities", "Entertainment",
+    "Shopping", "Health", "Education", "Travel", "Other",
+]
+
+# Anything but letters, in any script
+_NOTE_NOISE_RE = re.compile(r"[\W\d_]+")
+_NOTE_KEY_LENGTH = 200
+
+
+class CategoryCache:
+    """Bounded LRU of normalized note -> category"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            category = self._entries.get(key)
+            if category is not None:
+                self._entries.move_to_end(key)
+            return category
+
+    def put(self, key: str, category: str) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = category
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+category_cache = CategoryCache(CATEGORY_CACHE_SIZE)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service that keeps failing"""
+
+
+class CircuitBreaker:
+    """Fails fast while a remote service is down.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    raise CircuitOpenError for reset_seconds.  Then a single trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_seconds
+
+    def call(self, function, *args, **kwargs):
+        with self._lock:
+            trial = self._opened_at is not None
+            if trial:
+                if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                    raise CircuitOpenError("The AI model is unavailable; not calling it for now")
+                self._trial_running = True
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+                self._trial_running = False
+                if trial or self._failures >= self.failure_threshold:
+                    if not trial:
+                        logger.warning("Opening the AI model circuit after %d failures", self._failures)
+                    self._opened_at = time.monotonic()
+            raise
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+        return result
+
+
+model_breaker = CircuitBreaker(MODEL_BREAKER_FAILURES, MODEL_BREAKER_RESET_SECONDS)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> openai.OpenAI:
+    """Shared OpenAI client with the configured timeout and base URL"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # api_key None falls back to the OPENAI_API_KEY environment variable
+            _client = openai.OpenAI(
+                api_key=openai.api_key, base_url=OPENAI_BASE_URL, timeout=OPENAI_TIMEOUT_SECONDS, max_retries=OPENAI_MAX_RETRIES,
+            )
+        return _client
+
+
+def normalize_note(note: str) -> str:
+    """Cache key for a note: casefolded words only, so "Starbucks #1234" and
+    "STARBUCKS 0987" share an entry; empty when the note has no letters"""
+    return " ".join(_NOTE_NOISE_RE.sub(" ", (note or "").casefold()).split())[:_NOTE_KEY_LENGTH]
+
+
+def _parse_categories(content: str, count: int) -> List[Optional[str]]:
+    """Categories from a model reply, one per note; None where the reply is unusable"""
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that categorizes expenses."},
-                {"role": "user", "content": f"Categorize this expense: {note}. Respond with only one of these categories: Food, Transport, Housing, Utilities, Entertainment, Shopping, Health, Education, Travel, Other."}
-            ],
-            max_tokens=10
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error in AI categorization: {e}")
-        # Fallback to rule-based categorization
-        return rule_based_categorization(note)
+        answers = json.loads(content)
+    except ValueError:
+        answers = [line.strip(" -*\t\"'0123456789.)") for line in content.splitlines() if line.strip()]
+    if not isinstance(answers, list) or len(answers) != count:
+        return [None] * count
+    by_name = {category.lower(): category for category in CATEGORIES}
+    return [by_name.get(str(answer).strip().lower()) for answer in answers]
 
 
-def rule_based_categorization(note: str) -> str:
-    """Simple rule-based categorization as a fallback"""
-    note = note.lower()
-    if any(word in note for word in ["food", "restaurant", "meal", "lunch", "dinner", "breakfast", "cafe", "coffee"]):
-        return "Food"
-    elif any(word in note for word in ["transport", "uber", "taxi", "bus", "train", "gas", "fuel", "car"]):
-        return "Transport"
-    elif any(word in note for word in ["rent", "house", "apartment", "mortgage"]):
-        return "Housing"
-    elif any(word in note for word in ["electricity", "water", "internet", "phone", "bill"]):
-        return "Utilities"
-    elif any(word in note for word in ["movie", "game", "concert", "show", "theater", "netflix", "spotify"]):
-        return "Entertainment"
-    elif any(word in note for word in ["clothes", "shoes", "mall", "amazon", "online", "purchase"]):
-        return "Shopping"
-    elif any(word in note for word in ["doctor", "medicine", "hospital", "health", "medical", "pharmacy"]):
-        return "Health"
-    elif any(word in note for word in ["school", "college", "university", "course", "class", "book", "tuition"]):
-        return "Education"
-    elif any(word in note for word in ["hotel", "flight", "vacation", "trip", "travel", "airbnb"]):
-        return "Travel"
+def _model_categories(notes: List[str]) -> List[Optional[str]]:
+    """Categorize notes with one model call"""
+    listing = "\n".join(f"{i}. {note}" for i, note in enumerate(notes, start=1))
+    response = model_breaker.call(
+        get_client().chat.completions.create,
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant that categorizes expenses."},
+            {"role": "user", "content": (
+                f"Categorize each of these {len(notes)} expenses:\n{listing}\n\n"
+                f"Use only these categories: {', '.join(CATEGORIES)}. "
+                "Respond with only a JSON array of category names, one per expense, in the same order."
+            )},
+        ],
+        max_tokens=8 * len(notes) + 16,
+    )
+    return _parse_categories(response.choices[0].message.content.strip(), len(notes))
+
+
+def _store_categories(db: Session, categories: Dict[str, str]) -> None:
+    table = models.CategorizationCache.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
     else:
-        return "Other"
+        from sqlalchemy.dialects.sqlite import insert
+    # Another process may have stored the same note meanwhile; its answer wins
+    db.execute(insert(table).on_conflict_do_nothing(), [
+        {"note_key": key, "category": category, "created_at": datetime.utcnow()}
+        for key, category in categories.items()
+    ])
+    db.commit()
+
+
+def categorize_expenses(notes: List[str], db: Optional[Session] = None, user_id: Optional[int] = None) -> List[str]:
+    """Categorize many notes, asking the model only about ones never seen before.
+
+    With a user_id, the user's own classifier (local_classifier.py) answers
+    the notes it is confident about.  The rest go through the in-process
+    LRU, then the categorization_cache table, then the model in batches of
+    CATEGORIZE_BATCH_SIZE distinct notes.  Notes the model can't answer fall
+    back to rule_based_categorization and are not cached, so they are
+    retried next time.
+    """
+    keys = [normalize_note(note) for note in notes]
+    predicted: Dict[str, Optional[str]] = {}
+    found: Dict[str, str] = {}
+    # Sessions connect lazily, so this costs nothing when every note is cached
+    session = db if db is not None else SessionLocal()
+    try:
+        if user_id is not None:
+            # The classifier sees the raw note, as it did in training
+            predicted = {note: local_classifier.predict(session, user_id, note) for note in dict.fromkeys(notes)}
+        pending = dict.fromkeys(key for note, key in zip(notes, keys) if predicted.get(note) is None)
+        for key in pending:
+            if not key:
+                # Nothing but digits and punctuation, nothing to ask about
+                found[key] = "Other"
+                continue
+            category = category_cache.get(key)
+            if category is not None:
+                found[key] = category
+
+        missing = [key for key in pending if key not in found]
+        table = models.CategorizationCache
+        for start in range(0, len(missing), 1000):
+            for key, category in session.execute(
+                select(table.note_key, table.category).where(table.note_key.in_(missing[start:start + 1000]))
+            ):
+                found[key] = category
+                category_cache.put(key, category)
+
+        missing = [key for key in missing if key not in found]
+        learned: Dict[str, str] = {}
+        for start in range(0, len(missing), CATEGORIZE_BATCH_SIZE):
+            batch = missing[start:start + CATEGORIZE_BATCH_SIZE]
+            try:
+                answers = _model_categories(batch)
+            except Exception as e:
+                logger.warning("AI categorization failed for %d notes: %s", len(batch), e)
+                answers = [None] * len(batch)
+            for key, category in zip(batch, answers):
+                if category is None:
+                    found[key] = rule_based_categorization(key)
+                else:
+                    found[key] = learned[key] = category
+                    category_cache.put(key, category)
+        if learned:
+            _store_categories(session, learned)
+    finally:
+        if db is None:
+            session.close()
+
+    return [predicted.get(note) or found[key] for note, key in zip(notes, keys)]
+
+
+def categorize_expense(note: str, db: Optional[Session] = None, user_id: Optional[int] = None) -> str:
+    """Use AI to categorize an expense based on the note"""
+    return categorize_expenses([note], db, user_id)[0]
+
+
+def rule_based_categorization(note: str) -> str:
+    """Keyword-based categorization as a fallback"""
+    return categorizer.default_categorizer().categorize(note)
 
 
 def suggest_budget(expenses: List[Dict[str, Any]]) -> Dict[str, float]:
@@ -68,97 +294,50 @@ def suggest_budget(expenses: List[Dict[str, Any]]) -> Dict[str, float]:
     return budget_suggestions
 
 
-def get_savings_tips(expenses: List[Dict[str, Any]]) -> List[str]:
-    """Generate personalized savings tips based on spending patterns"""
+GENERIC_SAVINGS_TIPS = [
+    "Consider making coffee at home instead of buying it",
+    "Look for sales and discounts when shopping",
+    "Use public transportation instead of taxis when possible",
+    "Cook meals at home instead of eating out",
+    "Cancel unused subscriptions",
+]
+
+_TIP_PREFIX_RE = re.compile(r"^(?:\d+[.)]|[-*\u2022])\s*")
+
+
+def savings_tips_for_totals(category_totals: Dict[str, float]) -> Optional[List[str]]:
+    """Model-written savings tips for the top spending categories, or None
+    when the model is unavailable"""
+    top_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:3]
+    prompt = "Based on my spending, here are my top expense categories:\n"
+    for category, amount in top_categories:
+        prompt += f"- {category}: ${amount:.2f}\n"
+    prompt += "\nGive me 5 specific and actionable tips to save money based on these spending patterns. Be concise."
+
     try:
-        # Analyze spending patterns
-        category_totals = {}
-        for expense in expenses:
-            category = expense.get("category", "Other")
-            amount = expense.get("amount", 0)
-            if category in category_totals:
-                category_totals[category] += amount
-            else:
-                category_totals[category] = amount
-        
-        # Find the top spending categories
-        sorted_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)
-        top_categories = sorted_categories[:3] if len(sorted_categories) >= 3 else sorted_categories
-        
-        # Generate tips based on top spending categories
-        prompt = "Based on my spending, here are my top expense categories:\n"
-        for category, amount in top_categories:
-            prompt += f"- {category}: ${amount:.2f}\n"
-        prompt += "\nGive me 5 specific and actionable tips to save money based on these spending patterns. Be concise."
-        
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
+        response = model_breaker.call(
+            get_client().chat.completions.create,
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "You are a helpful financial advisor."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=200
         )
-        
-        # Parse the response to get individual tips
-        tips_text = response.choices[0].message.content.strip()
-        tips = [tip.strip() for tip in tips_text.split("\n") if tip.strip()]
-        
-        # Filter out any non-tip lines (like numbering or headers)
-        filtered_tips = []
-        for tip in tips:
-            # Remove numbering if present
-            if tip.startswith("1." or "2." or "3." or "4." or "5."):
-                tip = tip[2:].strip()
-            if tip.startswith("-"):
-                tip = tip[1:].strip()
-            if tip:
-                filtered_tips.append(tip)
-        
-        return filtered_tips[:5]  # Return at most 5 tips
-    
-    except Exception as e:
-        print(f"Error generating savings tips: {e}")
-        # Fallback to generic tips
-        return [
-            "Consider making coffee at home instead of buying it",
-            "Look for sales and discounts when shopping",
-            "Use public transportation instead of taxis when possible",
-            "Cook meals at home instead of eating out",
-            "Cancel unused subscriptions"
-        ]
-
-
-def extract_text_from_receipt(image_path: str) -> Dict[str, Any]:
-    """Extract information from a receipt image using OCR"""
-    try:
-        import pytesseract
-        from PIL import Image
-        
-        # Extract text from image
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image)
-        
-        # Use AI to parse the receipt text
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that extracts information from receipts."},
-                {"role": "user", "content": f"Extract the total amount, date, and merchant name from this receipt text:\n\n{text}\n\nRespond in JSON format with keys 'amount', 'date', and 'merchant'."}
-            ],
-            max_tokens=100
-        )
-        
-        # Parse the response
-        import json
-        result = json.loads(response.choices[0].message.content.strip())
-        
-        # Add a suggested category
-        merchant = result.get("merchant", "")
-        result["category"] = categorize_expense(merchant)
-        
-        return result
-    
     except Exception as e:
-        print(f"Error extracting text from receipt: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        logger.warning("Generating savings tips failed: %s", e)
+        return None
+
+    # One tip per line, without numbering or bullets
+    tips_text = response.choices[0].message.content.strip()
+    tips = [_TIP_PREFIX_RE.sub("", line.strip()) for line in tips_text.split("\n")]
+    return [tip for tip in tips if tip][:5] or None
+
+
+def get_savings_tips(expenses: List[Dict[str, Any]]) -> List[str]:
+    """Generate personalized savings tips based on spending patterns"""
+    category_totals: Dict[str, float] = {}
+    for expense in expenses:
+        category = expense.get("category", "Other")
+        category_totals[category] = category_totals.get(category, 0) + expense.get("amount", 0)
+    return savings_tips_for_totals(category_totals) or list(GENERIC_SAVINGS_TIPS)
@@ -24,6 +24,11 @@ sys.path.insert(0, dirname(dirname(abspath(__file__))))
 from models import Base
 target_metadata = Base.metadata
 
+# Prefer the same DATABASE_URL the application uses over alembic.ini
+import os
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
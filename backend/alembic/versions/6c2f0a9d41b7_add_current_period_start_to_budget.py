@@ -0,0 +1,26 @@
+"""add current_period_start to Budget model
+
+Revision ID: 6c2f0a9d41b7
+Revises: 235a81dcd4f1
+Create Date: 2026-10-17 09:12:41.208517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2f0a9d41b7'
+down_revision = '235a81dcd4f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('budgets', sa.Column('current_period_start', sa.DateTime(), nullable=True))
+    # Existing totals were overwritten on every read, so leave the period empty;
+    # the first read or `python budget_tracking.py rebuild` fills it in.
+
+
+def downgrade():
+    op.drop_column('budgets', 'current_period_start')
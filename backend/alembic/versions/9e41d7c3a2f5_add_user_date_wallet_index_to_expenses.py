@@ -0,0 +1,29 @@
+"""add (user_id, date, wallet_id) index to expenses
+
+Revision ID: 9e41d7c3a2f5
+Revises: 6c2f0a9d41b7
+Create Date: 2026-10-17 10:03:18.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e41d7c3a2f5'
+down_revision = '6c2f0a9d41b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_expenses_user_date_wallet',
+        'expenses',
+        ['user_id', 'date', 'wallet_id'],
+        postgresql_include=['amount'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_expenses_user_date_wallet', table_name='expenses')
@@ -0,0 +1,35 @@
+"""add user_classifiers table
+
+Revision ID: a9d3e5f7c1b4
+Revises: f2a6c8e0b5d3
+Create Date: 2026-10-17 17:18:55.093621
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e5f7c1b4'
+down_revision = 'f2a6c8e0b5d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_classifiers',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('categories', sa.JSON(), nullable=False),
+        sa.Column('class_counts', sa.JSON(), nullable=False),
+        sa.Column('feature_counts', sa.LargeBinary(), nullable=False),
+        sa.Column('examples', sa.Integer(), nullable=True),
+        sa.Column('last_expense_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('user_classifiers')
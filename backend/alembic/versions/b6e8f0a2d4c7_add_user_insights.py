@@ -0,0 +1,33 @@
+"""add user_insights table
+
+Revision ID: b6e8f0a2d4c7
+Revises: a9d3e5f7c1b4
+Create Date: 2026-10-17 19:06:41.381257
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e8f0a2d4c7'
+down_revision = 'a9d3e5f7c1b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_insights',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('budget_suggestions', sa.JSON(), nullable=False),
+        sa.Column('savings_tips', sa.JSON(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.Column('stale', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('user_insights')
@@ -0,0 +1,30 @@
+"""add expense listing indexes for keyset pagination
+
+Revision ID: c5a83e1f0d94
+Revises: 9e41d7c3a2f5
+Create Date: 2026-10-17 11:26:05.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a83e1f0d94'
+down_revision = '9e41d7c3a2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_expenses_user_date_id', 'expenses', ['user_id', 'date', 'id'])
+    op.create_index('ix_expenses_user_category_date_id', 'expenses', ['user_id', 'category', 'date', 'id'])
+    op.create_index('ix_expenses_user_wallet_date_id', 'expenses', ['user_id', 'wallet_id', 'date', 'id'])
+    op.create_index('ix_expenses_tags', 'expenses', ['tags'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_expenses_tags', table_name='expenses')
+    op.drop_index('ix_expenses_user_wallet_date_id', table_name='expenses')
+    op.drop_index('ix_expenses_user_category_date_id', table_name='expenses')
+    op.drop_index('ix_expenses_user_date_id', table_name='expenses')
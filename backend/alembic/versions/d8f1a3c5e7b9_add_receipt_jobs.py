@@ -0,0 +1,40 @@
+"""add receipt_jobs table
+
+Revision ID: d8f1a3c5e7b9
+Revises: b6e8f0a2d4c7
+Create Date: 2026-10-17 21:12:05.644310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f1a3c5e7b9'
+down_revision = 'b6e8f0a2d4c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'receipt_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('image_url', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_receipt_jobs_status_created_at', 'receipt_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_receipt_jobs_status_created_at', table_name='receipt_jobs')
+    op.drop_table('receipt_jobs')
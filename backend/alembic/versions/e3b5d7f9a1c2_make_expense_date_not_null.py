@@ -0,0 +1,37 @@
+"""make expenses.date not null
+
+Expenses created without a date were stored with NULL, which keyset
+pagination can't page past.  The upgrade dates them 1970-01-01 00:00:00:
+expenses have no created_at or other record of when they were entered, so
+there is no real date to backfill from, and the epoch sorts them last and
+keeps them out of every dated budget and report, as NULL did.  They are still
+listed, at the end of GET /expenses/ and in exports.
+
+The backfilled rows are not recorded anywhere, so the downgrade treats every
+expense dated exactly 1970-01-01 00:00:00 as one of them and sets it back to
+NULL; a genuine expense at that instant would be cleared too.
+
+Revision ID: e3b5d7f9a1c2
+Revises: d8f1a3c5e7b9
+Create Date: 2026-10-17 22:03:48.217936
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b5d7f9a1c2'
+down_revision = 'd8f1a3c5e7b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE expenses SET date = '1970-01-01' WHERE date IS NULL")
+    op.alter_column('expenses', 'date', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    op.alter_column('expenses', 'date', existing_type=sa.DateTime(), nullable=True)
+    op.execute("UPDATE expenses SET date = NULL WHERE date = '1970-01-01'")
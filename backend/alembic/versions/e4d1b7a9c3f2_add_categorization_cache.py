@@ -0,0 +1,30 @@
+"""add categorization_cache table
+
+Revision ID: e4d1b7a9c3f2
+Revises: c5a83e1f0d94
+Create Date: 2026-10-17 14:02:37.519204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4d1b7a9c3f2'
+down_revision = 'c5a83e1f0d94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'categorization_cache',
+        sa.Column('note_key', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('note_key'),
+    )
+
+
+def downgrade():
+    op.drop_table('categorization_cache')
@@ -0,0 +1,36 @@
+"""add category_rules table
+
+Revision ID: f2a6c8e0b5d3
+Revises: e4d1b7a9c3f2
+Create Date: 2026-10-17 15:40:12.774390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8e0b5d3'
+down_revision = 'e4d1b7a9c3f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'category_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('keyword', sa.String(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'keyword', name='uq_category_rules_user_keyword'),
+    )
+    op.create_index(op.f('ix_category_rules_id'), 'category_rules', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_category_rules_id'), table_name='category_rules')
+    op.drop_table('category_rules')
@@ -0,0 +1,452 @@
+"""Database-side aggregations behind the /analytics routes.
+
+Each report is split into a statement builder and a function that shapes the
+result rows into the response body, so the same SQL can be executed by any
+session.
+
+Usage:
+    python analytics.py explain wallet-distribution --user-id ID [--time-range week|month|year]
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DateTime, and_, case, func, literal, select, text, union_all
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+import models
+from database import SessionLocal
+from utils import add_months, month_start
+
+# Placeholder until income is tracked
+ESTIMATED_MONTHLY_INCOME = 5000
+
+# Upper bound for the /analytics/monthly-trends window (50 years)
+MAX_TREND_MONTHS = 600
+
+# Row caps for the grouped reports that can grow with a user's history
+DEFAULT_ROW_LIMIT = 1000
+MAX_ROW_LIMIT = 10000
+
+# Labels for breakdown keys that are NULL in the database
+UNCATEGORIZED_LABEL = "Uncategorized"
+NO_WALLET_LABEL = "No wallet"
+
+
+class _truncate(FunctionElement):
+    """date_trunc() to a fixed unit, with a SQLite rendering for local benchmarks"""
+    type = DateTime()
+    inherit_cache = True
+    unit = None
+    sqlite_modifier = None
+
+
+class trunc_month(_truncate):
+    inherit_cache = True
+    unit = "month"
+    sqlite_modifier = "start of month"
+
+
+class trunc_day(_truncate):
+    inherit_cache = True
+    unit = "day"
+    sqlite_modifier = "start of day"
+
+
+@compiles(trunc_month)
+@compiles(trunc_day)
+def _compile_truncate(element, compiler, **kw):
+    return f"date_trunc('{element.unit}', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(trunc_month, "sqlite")
+@compiles(trunc_day, "sqlite")
+def _compile_truncate_sqlite(element, compiler, **kw):
+    return f"datetime({compiler.process(element.clauses, **kw)}, '{element.sqlite_modifier}')"
+
+
+def time_range_start(time_range: str, now: datetime) -> datetime:
+    """Return the lower date bound for the week/month/year time_range filters"""
+    if time_range == "week":
+        return now - timedelta(days=7)
+    if time_range == "year":
+        return month_start(now).replace(month=1)
+    return month_start(now)
+
+
+def _window_conditions(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    """WHERE conditions restricting expenses to a user and an optional [start, end] window"""
+    conditions = [models.Expense.user_id == user_id]
+    if start is not None:
+        conditions.append(models.Expense.date >= start)
+    if end is not None:
+        conditions.append(models.Expense.date <= end)
+    return conditions
+
+
+def explain_plan(db: Session, statement) -> List[str]:
+    """Return the database's EXPLAIN output for a statement"""
+    compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    return [row[0] for row in db.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def _sum_where(condition, amount):
+    """SUM(amount) restricted to rows matching condition, 0.0 when none do"""
+    return func.coalesce(func.sum(case((condition, amount), else_=0.0)), 0.0)
+
+
+def summary_query(user_id: int, now: datetime):
+    """Build the single statement behind /analytics/summary.
+
+    The user's expenses from the earliest window of interest are scanned once.
+    Month, week and previous-month totals are conditional sums over that scan,
+    and the top category and person are picked with ROW_NUMBER() over grouped
+    sums.  People linked through person_id always rank ahead of the legacy
+    free-text person field.
+    """
+    this_month_start = month_start(now)
+    next_month_start = add_months(this_month_start, 1)
+    prev_month_start = add_months(this_month_start, -1)
+    week_start = now - timedelta(days=7)
+
+    scoped = (
+        select(
+            models.Expense.amount,
+            models.Expense.date,
+            models.Expense.category,
+            models.Expense.person,
+            models.Expense.person_id,
+        )
+        .where(
+            models.Expense.user_id == user_id,
+            models.Expense.date >= min(prev_month_start, week_start),
+            models.Expense.date < next_month_start,
+        )
+        .cte("scoped_expenses")
+    )
+    this_month = and_(scoped.c.date >= this_month_start, scoped.c.date < next_month_start)
+    this_week = and_(scoped.c.date >= week_start, scoped.c.date <= now)
+    prev_month = and_(scoped.c.date >= prev_month_start, scoped.c.date < this_month_start)
+
+    category_totals = (
+        select(
+            scoped.c.category,
+            func.row_number().over(order_by=func.sum(scoped.c.amount).desc()).label("rank"),
+        )
+        .where(this_month)
+        .group_by(scoped.c.category)
+        .subquery()
+    )
+    top_category = (
+        select(category_totals.c.category)
+        .where(category_totals.c.rank == 1)
+        .correlate(None)
+        .scalar_subquery()
+    )
+
+    linked_people = (
+        select(
+            models.Person.name.label("name"),
+            literal(0).label("source"),
+            func.sum(scoped.c.amount).label("amount"),
+        )
+        .select_from(scoped.join(models.Person, models.Person.id == scoped.c.person_id))
+        .where(this_month)
+        .group_by(models.Person.name)
+    )
+    legacy_people = (
+        select(
+            scoped.c.person.label("name"),
+            literal(1).label("source"),
+            func.sum(scoped.c.amount).label("amount"),
+        )
+        .where(this_month, scoped.c.person.isnot(None))
+        .group_by(scoped.c.person)
+    )
+    people = union_all(linked_people, legacy_people).subquery()
+    ranked_people = select(
+        people.c.name,
+        func.row_number().over(order_by=(people.c.source, people.c.amount.desc())).label("rank"),
+    ).subquery()
+    top_person = (
+        select(ranked_people.c.name)
+        .where(ranked_people.c.rank == 1)
+        .correlate(None)
+        .scalar_subquery()
+    )
+
+    return select(
+        _sum_where(this_month, scoped.c.amount).label("total"),
+        _sum_where(this_week, scoped.c.amount).label("weekly_total"),
+        _sum_where(prev_month, scoped.c.amount).label("prev_month_total"),
+        top_category.label("top_category"),
+        top_person.label("top_person"),
+    ).select_from(scoped)
+
+
+def summary_from_row(row) -> dict:
+    """Shape the summary_query row into the /analytics/summary response"""
+    total = row.total or 0.0
+    prev_month_total = row.prev_month_total or 0.0
+
+    monthly_change = 0
+    if prev_month_total > 0:
+        monthly_change = ((total - prev_month_total) / prev_month_total) * 100
+
+    savings_rate = 0
+    if ESTIMATED_MONTHLY_INCOME > 0:
+        savings_rate = ((ESTIMATED_MONTHLY_INCOME - total) / ESTIMATED_MONTHLY_INCOME) * 100
+
+    return {
+        "total": total,
+        "topCategory": row.top_category or "N/A",
+        "topPerson": row.top_person or "You",
+        "weeklyTotal": row.weekly_total or 0.0,
+        "monthlyChange": monthly_change,
+        "savingsRate": savings_rate
+    }
+
+
+def get_summary(db: Session, user_id: int, now: Optional[datetime] = None) -> dict:
+    """Compute /analytics/summary in one round trip"""
+    row = db.execute(summary_query(user_id, now or datetime.now())).one()
+    return summary_from_row(row)
+
+
+def monthly_trends_query(user_id: int, first_month: datetime, end: datetime, split_by: Optional[str] = None):
+    """Build the GROUP BY month statement behind /analytics/monthly-trends.
+
+    With split_by set to "category" or "wallet" each month is further grouped
+    by that key in the same statement.
+    """
+    month = trunc_month(models.Expense.date).label("month")
+    columns = [month]
+    group_by = [month]
+    query_from = models.Expense.__table__
+
+    if split_by == "category":
+        columns.append(models.Expense.category.label("split_key"))
+        group_by.append(models.Expense.category)
+    elif split_by == "wallet":
+        query_from = query_from.outerjoin(models.Wallet, models.Wallet.id == models.Expense.wallet_id)
+        columns.append(models.Wallet.name.label("split_key"))
+        group_by.extend([models.Expense.wallet_id, models.Wallet.name])
+
+    return (
+        select(*columns, func.sum(models.Expense.amount).label("amount"))
+        .select_from(query_from)
+        .where(
+            models.Expense.user_id == user_id,
+            models.Expense.date >= first_month,
+            models.Expense.date < end,
+        )
+        .group_by(*group_by)
+    )
+
+
+def monthly_trends_from_rows(rows, first_month: datetime, months: int, split_by: Optional[str] = None) -> List[dict]:
+    """Shape grouped rows into one entry per month, oldest first, filling gaps with zero"""
+    totals = defaultdict(float)
+    breakdowns = defaultdict(lambda: defaultdict(float))
+    empty_label = NO_WALLET_LABEL if split_by == "wallet" else UNCATEGORIZED_LABEL
+    for row in rows:
+        key = (row.month.year, row.month.month)
+        totals[key] += row.amount or 0.0
+        if split_by:
+            breakdowns[key][row.split_key or empty_label] += row.amount or 0.0
+
+    trends = []
+    for i in range(months):
+        month = add_months(first_month, i)
+        key = (month.year, month.month)
+        entry = {
+            "month": month.strftime("%b %Y"),
+            "amount": totals.get(key, 0.0)
+        }
+        if split_by:
+            entry["breakdown"] = dict(breakdowns.get(key, {}))
+        trends.append(entry)
+    return trends
+
+
+def trend_window(months: int, now: datetime) -> Tuple[datetime, datetime]:
+    """Return [first month start, next month start) covering the last `months` months"""
+    next_month_start = add_months(month_start(now), 1)
+    return add_months(next_month_start, -months), next_month_start
+
+
+def get_monthly_trends(db: Session, user_id: int, months: int, split_by: Optional[str] = None, now: Optional[datetime] = None) -> List[dict]:
+    """Compute /analytics/monthly-trends for the last `months` calendar months, current month included"""
+    first_month, next_month_start = trend_window(months, now or datetime.now())
+    rows = db.execute(monthly_trends_query(user_id, first_month, next_month_start, split_by))
+    return monthly_trends_from_rows(rows, first_month, months, split_by)
+
+
+def wallet_distribution_query(user_id: int, start: datetime):
+    """Build the joined aggregate behind /analytics/wallet-distribution.
+
+    Expenses without a wallet form their own group.  Percentages are computed
+    against the window total with SUM() OVER (), so the result needs no
+    post-processing beyond labelling.  The (user_id, date, wallet_id)
+    index on expenses covers the scan.
+    """
+    total = func.sum(models.Expense.amount)
+    return (
+        select(
+            models.Expense.wallet_id,
+            models.Wallet.name.label("wallet_name"),
+            total.label("amount"),
+            func.coalesce(total * 100.0 / func.nullif(func.sum(total).over(), 0), 0.0).label("percentage"),
+        )
+        .select_from(models.Expense.__table__.outerjoin(models.Wallet, models.Wallet.id == models.Expense.wallet_id))
+        .where(models.Expense.user_id == user_id, models.Expense.date >= start)
+        .group_by(models.Expense.wallet_id, models.Wallet.name)
+        .order_by(total.desc())
+    )
+
+
+def wallet_distribution_from_rows(rows) -> List[dict]:
+    """Shape wallet_distribution_query rows into the response body"""
+    return [
+        {
+            "wallet_id": row.wallet_id,
+            "wallet_name": row.wallet_name if row.wallet_id is not None else NO_WALLET_LABEL,
+            "amount": row.amount,
+            "percentage": row.percentage
+        }
+        for row in rows
+    ]
+
+
+def get_wallet_distribution(db: Session, user_id: int, time_range: str, now: Optional[datetime] = None) -> List[dict]:
+    """Compute /analytics/wallet-distribution in one round trip"""
+    start = time_range_start(time_range, now or datetime.now())
+    return wallet_distribution_from_rows(db.execute(wallet_distribution_query(user_id, start)))
+
+
+def category_breakdown_query(user_id: int, start: datetime, end: Optional[datetime] = None):
+    """Build the per-category totals and percentages behind /analytics/category-breakdown"""
+    total = func.sum(models.Expense.amount)
+    return (
+        select(
+            models.Expense.category,
+            total.label("amount"),
+            func.coalesce(total * 100.0 / func.nullif(func.sum(total).over(), 0), 0.0).label("percentage"),
+        )
+        .where(*_window_conditions(user_id, start, end))
+        .group_by(models.Expense.category)
+        .order_by(total.desc())
+    )
+
+
+def category_breakdown_from_rows(rows) -> List[dict]:
+    """Shape category_breakdown_query rows into the response body"""
+    return [
+        {
+            "category": row.category,
+            "amount": row.amount,
+            "percentage": row.percentage
+        }
+        for row in rows
+    ]
+
+
+def get_category_breakdown(db: Session, user_id: int, time_range: str, start: Optional[datetime] = None, end: Optional[datetime] = None, now: Optional[datetime] = None) -> List[dict]:
+    """Compute /analytics/category-breakdown; an explicit start overrides time_range"""
+    if start is None:
+        start = time_range_start(time_range, now or datetime.now())
+    return category_breakdown_from_rows(db.execute(category_breakdown_query(user_id, start, end)))
+
+
+def daily_totals_query(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = DEFAULT_ROW_LIMIT):
+    """Build the per-day totals behind /analytics/daily, most recent days first"""
+    day = trunc_day(models.Expense.date).label("day")
+    return (
+        select(day, func.sum(models.Expense.amount).label("amount"))
+        .where(*_window_conditions(user_id, start, end))
+        .group_by(day)
+        .order_by(day.desc())
+        .limit(limit)
+    )
+
+
+def daily_totals_from_rows(rows) -> dict:
+    """Shape daily_totals_query rows into {"YYYY-MM-DD": amount} in date order"""
+    return {row.day.strftime("%Y-%m-%d"): row.amount for row in reversed(list(rows))}
+
+
+def get_daily_totals(db: Session, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = DEFAULT_ROW_LIMIT) -> dict:
+    """Compute /analytics/daily"""
+    return daily_totals_from_rows(db.execute(daily_totals_query(user_id, start, end, limit)))
+
+
+def person_totals_query(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = DEFAULT_ROW_LIMIT):
+    """Build the per-person totals behind /analytics/person, largest first"""
+    total = func.sum(models.Expense.amount)
+    return (
+        select(models.Expense.person, total.label("amount"))
+        .where(*_window_conditions(user_id, start, end))
+        .group_by(models.Expense.person)
+        .order_by(total.desc())
+        .limit(limit)
+    )
+
+
+def person_totals_from_rows(rows) -> dict:
+    """Shape person_totals_query rows into {person: amount}"""
+    return {row.person: row.amount for row in rows}
+
+
+def get_person_totals(db: Session, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = DEFAULT_ROW_LIMIT) -> dict:
+    """Compute /analytics/person"""
+    return person_totals_from_rows(db.execute(person_totals_query(user_id, start, end, limit)))
+
+
+def budget_suggestions_query(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = DEFAULT_ROW_LIMIT):
+    """Build the per-category spend behind /ai/budget-suggestions"""
+    total = func.sum(models.Expense.amount)
+    return (
+        select(models.Expense.category, total.label("amount"))
+        .where(*_window_conditions(user_id, start, end))
+        .group_by(models.Expense.category)
+        .order_by(total.desc())
+        .limit(limit)
+    )
+
+
+def get_budget_suggestions(db: Session, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, limit: int = DEFAULT_ROW_LIMIT) -> dict:
+    """Suggest a budget 20% higher than the spend in each category"""
+    return {
+        row.category: row.amount * 1.2
+        for row in db.execute(budget_suggestions_query(user_id, start, end, limit))
+    }
+
+EXPLAINABLE_QUERIES = {
+    "wallet-distribution": lambda args: wallet_distribution_query(
+        args.user_id, time_range_start(args.time_range, datetime.now())
+    ),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect analytics query plans")
+    parser.add_argument("command", choices=["explain"])
+    parser.add_argument("query", choices=sorted(EXPLAINABLE_QUERIES))
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--time-range", default="month", choices=["week", "month", "year"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        for line in explain_plan(db, EXPLAINABLE_QUERIES[args.query](args)):
+            print(line)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
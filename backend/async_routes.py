@@ -0,0 +1,219 @@
+"""Expense and analytics routes served from the async engine.
+
+Mounted under /async when ASYNC_DATABASE is enabled.  The routes mirror their
+synchronous counterparts in main.py and reuse the same statement builders, but
+run on the event loop with an AsyncSession instead of occupying a threadpool
+thread per request.
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import analytics
+import budget_events
+import budget_tracking
+import database
+import expense_queries
+import models
+import schemas
+from auth import get_current_user_async
+from database import get_async_db
+
+router = APIRouter(prefix="/async", tags=["async"])
+
+
+async def _fetch_all(statement) -> list:
+    """Run a statement on its own session so several can be in flight at once"""
+    async with database.AsyncSessionLocal() as session:
+        return (await session.execute(statement)).all()
+
+
+async def _get_user_expense(db: AsyncSession, expense_id: int, user_id: int) -> models.Expense:
+    expense = await db.scalar(
+        select(models.Expense).where(models.Expense.id == expense_id, models.Expense.user_id == user_id)
+    )
+    if expense is None:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    return expense
+
+
+# Expense routes
+@router.post("/expenses/", response_model=schemas.Expense)
+async def create_expense(expense: schemas.ExpenseCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
+    db_expense = models.Expense(
+        # A missing date falls back to the column default (now)
+        **expense.dict(exclude_none=True),
+        user_id=current_user.id
+    )
+    db.add(db_expense)
+    await db.flush()
+    await db.run_sync(
+        budget_tracking.apply_expense_deltas,
+        current_user.id,
+        [(db_expense.category, db_expense.date, db_expense.amount)],
+    )
+    await db.commit()
+    budget_events.publish(current_user.id, [db_expense.category])
+    await db.refresh(db_expense)
+    return db_expense
+
+
+@router.get("/expenses/", response_model=List[schemas.Expense])
+async def read_expenses(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=expense_queries.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    wallet_id: Optional[int] = None,
+    person: Optional[str] = None,
+    person_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+):
+    filters = expense_queries.expense_filters(current_user.id, start, end, category, wallet_id, person, person_id, tag)
+    try:
+        query = expense_queries.expense_page_query(filters, cursor, limit, skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    expenses, next_cursor = expense_queries.split_page((await db.scalars(query)).all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return expenses
+
+
+@router.get("/expenses/{expense_id}", response_model=schemas.Expense)
+async def read_expense(expense_id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
+    return await _get_user_expense(db, expense_id, current_user.id)
+
+
+@router.put("/expenses/{expense_id}", response_model=schemas.Expense)
+async def update_expense(expense_id: int, expense: schemas.ExpenseUpdate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
+    db_expense = await _get_user_expense(db, expense_id, current_user.id)
+
+    previous = (db_expense.category, db_expense.date, db_expense.amount)
+    update_data = expense.dict(exclude_unset=True)
+    if "date" in update_data and update_data["date"] is None:
+        # Expenses always have a date; null leaves it unchanged
+        del update_data["date"]
+    for key, value in update_data.items():
+        setattr(db_expense, key, value)
+
+    await db.run_sync(budget_tracking.apply_expense_deltas, current_user.id, [
+        (previous[0], previous[1], -(previous[2] or 0.0)),
+        (db_expense.category, db_expense.date, db_expense.amount),
+    ])
+    await db.commit()
+    budget_events.publish(current_user.id, [previous[0], db_expense.category])
+    await db.refresh(db_expense)
+    return db_expense
+
+
+@router.delete("/expenses/{expense_id}", response_model=schemas.Expense)
+async def delete_expense(expense_id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
+    expense = await _get_user_expense(db, expense_id, current_user.id)
+    await db.delete(expense)
+    await db.run_sync(
+        budget_tracking.apply_expense_deltas,
+        current_user.id,
+        [(expense.category, expense.date, -(expense.amount or 0.0))],
+    )
+    await db.commit()
+    budget_events.publish(current_user.id, [expense.category])
+    return expense
+
+
+# Analytics routes
+@router.get("/analytics/summary")
+async def get_summary_analytics(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async)):
+    row = (await db.execute(analytics.summary_query(current_user.id, datetime.now()))).one()
+    return analytics.summary_from_row(row)
+
+
+@router.get("/analytics/category-breakdown")
+async def get_category_breakdown_analytics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+    time_range: str = "month",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    if start is None:
+        start = analytics.time_range_start(time_range, datetime.now())
+    rows = await db.execute(analytics.category_breakdown_query(current_user.id, start, end))
+    return analytics.category_breakdown_from_rows(rows)
+
+
+@router.get("/analytics/daily")
+async def get_daily_analytics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(analytics.DEFAULT_ROW_LIMIT, ge=1, le=analytics.MAX_ROW_LIMIT),
+):
+    rows = await db.execute(analytics.daily_totals_query(current_user.id, start, end, limit))
+    return analytics.daily_totals_from_rows(rows)
+
+
+@router.get("/analytics/monthly-trends")
+async def get_monthly_trends_analytics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+    months: int = Query(6, ge=1, le=analytics.MAX_TREND_MONTHS),
+    split_by: Optional[Literal["category", "wallet"]] = None,
+):
+    first_month, next_month_start = analytics.trend_window(months, datetime.now())
+    rows = await db.execute(analytics.monthly_trends_query(current_user.id, first_month, next_month_start, split_by))
+    return analytics.monthly_trends_from_rows(rows, first_month, months, split_by)
+
+
+@router.get("/analytics/person")
+async def get_person_analytics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(analytics.DEFAULT_ROW_LIMIT, ge=1, le=analytics.MAX_ROW_LIMIT),
+):
+    rows = await db.execute(analytics.person_totals_query(current_user.id, start, end, limit))
+    return analytics.person_totals_from_rows(rows)
+
+
+@router.get("/analytics/wallet-distribution")
+async def get_wallet_distribution_analytics(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user_async), time_range: str = "month"):
+    start = analytics.time_range_start(time_range, datetime.now())
+    rows = await db.execute(analytics.wallet_distribution_query(current_user.id, start))
+    return analytics.wallet_distribution_from_rows(rows)
+
+
+@router.get("/analytics/dashboard")
+async def get_dashboard_analytics(
+    current_user: models.User = Depends(get_current_user_async),
+    time_range: str = "month",
+    months: int = Query(6, ge=1, le=analytics.MAX_TREND_MONTHS),
+):
+    # The four dashboard reports are independent, so they run concurrently on
+    # separate connections instead of one after another
+    now = datetime.now()
+    start = analytics.time_range_start(time_range, now)
+    first_month, next_month_start = analytics.trend_window(months, now)
+    summary_rows, category_rows, trend_rows, wallet_rows = await asyncio.gather(
+        _fetch_all(analytics.summary_query(current_user.id, now)),
+        _fetch_all(analytics.category_breakdown_query(current_user.id, start)),
+        _fetch_all(analytics.monthly_trends_query(current_user.id, first_month, next_month_start)),
+        _fetch_all(analytics.wallet_distribution_query(current_user.id, start)),
+    )
+    return {
+        "summary": analytics.summary_from_row(summary_rows[0]),
+        "category_breakdown": analytics.category_breakdown_from_rows(category_rows),
+        "monthly_trends": analytics.monthly_trends_from_rows(trend_rows, first_month, months),
+        "wallet_distribution": analytics.wallet_distribution_from_rows(wallet_rows),
+    }
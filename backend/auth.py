@@ -1,26 +1,134 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
 import models
 import schemas
-from database import get_db
+from database import get_async_db, get_db
 
 # JWT configuration
 SECRET_KEY = "your-secret-key"  # In production, use a secure random key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440 # 24 hours
 
+# bcrypt runs on a bounded pool so logins never block the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+# Resolved users are cached per process to skip the users lookup on every request
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# Bearer token required by the operational endpoints (/metrics, /db/pool-stats);
+# while unset they answer 403 to everyone
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+class UserCache:
+    """Bounded LRU of resolved users keyed by token subject, with per-entry expiry.
+
+    Entries are plain snapshots of the users row rather than ORM instances, so
+    they never hold on to the session that loaded them.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._entries[subject]
+                return None
+            self._entries.move_to_end(subject)
+            return snapshot
+
+    def put(self, subject: str, snapshot: dict) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: Optional[str] = None, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if subject is not None:
+                self._entries.pop(subject, None)
+            if user_id is not None:
+                for key, (_, snapshot) in list(self._entries.items()):
+                    if snapshot["id"] == user_id:
+                        del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+_USER_COLUMNS = [column.key for column in models.User.__table__.columns]
+
+
+def _snapshot_user(user: models.User) -> dict:
+    return {key: getattr(user, key) for key in _USER_COLUMNS}
+
+
+def _detached_user(snapshot: dict) -> models.User:
+    """Turn a cached snapshot into a detached User that can be merged without querying.
+
+    Relationships such as settings are not cached and lazy-load as usual once merged.
+    """
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def invalidate_user(user: models.User) -> None:
+    """Drop a user from the cache; call after changing the users row"""
+    user_cache.invalidate(subject=user.email, user_id=user.id)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_modified_user(mapper, connection, target):
+    invalidate_user(target)
+    # Also drop it once the change is committed, in case another request
+    # re-cached the old row in between
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("modified_users", []).append((target.email, target.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for email, user_id in session.info.pop("modified_users", []):
+        user_cache.invalidate(subject=email, user_id=user_id)
+
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -29,6 +137,62 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+class PasswordHasherPool:
+    """Bounded thread pool for bcrypt work, with queue depth accounting.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism up
+    to the worker count; anything beyond that waits in the pool's queue
+    instead of taking every request thread.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    def _call(self, func, args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def run(self, func, *args):
+        """Run on the pool from a worker thread (sync routes), waiting for the result"""
+        with self._lock:
+            self.queued += 1
+        return self._executor.submit(self._call, func, args).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+            }
+
+
+password_pool = PasswordHasherPool(PASSWORD_HASH_WORKERS)
+
+
+# For sync routes, which FastAPI already runs in its threadpool; the hash pool
+# still bounds how many bcrypt calls run at once
+def verify_password_pooled(plain_password, hashed_password):
+    return password_pool.run(verify_password, plain_password, hashed_password)
+
+
+def get_password_hash_pooled(password):
+    return password_pool.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -40,21 +204,67 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_token(token: str) -> schemas.TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+            raise _credentials_exception()
+        return schemas.TokenData(email=email, user_id=payload.get("uid"))
     except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+        raise _credentials_exception()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    token_data = _decode_token(token)
+
+    snapshot = user_cache.get(token_data.email)
+    if snapshot is not None:
+        return db.merge(_detached_user(snapshot), load=False)
+
+    if token_data.user_id is not None:
+        # Tokens carrying the user id resolve with a primary key fetch
+        user = db.get(models.User, token_data.user_id)
+        if user is not None and user.email != token_data.email:
+            user = None
+    else:
+        user = db.query(models.User).filter(models.User.email == token_data.email).first()
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+    user_cache.put(token_data.email, _snapshot_user(user))
+    return user
+
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for routes running on the async engine"""
+    token_data = _decode_token(token)
+
+    snapshot = user_cache.get(token_data.email)
+    if snapshot is not None:
+        return await db.merge(_detached_user(snapshot), load=False)
+
+    if token_data.user_id is not None:
+        user = await db.get(models.User, token_data.user_id)
+        if user is not None and user.email != token_data.email:
+            user = None
+    else:
+        user = await db.scalar(select(models.User).where(models.User.email == token_data.email))
+    if user is None:
+        raise _credentials_exception()
+    user_cache.put(token_data.email, _snapshot_user(user))
+    return user
+
+
+def require_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    """Dependency for operational endpoints: the METRICS_TOKEN as a bearer token"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if not METRICS_TOKEN or scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
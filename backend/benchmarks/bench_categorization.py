@@ -0,0 +1,89 @@
+"""AI categorization cost with one model call per note vs. the batched, cached path.
+
+Runs against benchmarks.openai_stub, so no API key or network is needed, and
+against the categorization_cache table in whatever DATABASE_URL points at.
+Notes are drawn from a few dozen merchants with varying store numbers, the
+way they appear on bank exports.  Each scenario reports wall time and how
+many requests reached the model.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_categorization [--notes 500] [--latency 0.02]
+"""
+import argparse
+import os
+import random
+import time
+
+import ai_service
+import models
+from benchmarks.openai_stub import start_stub
+from database import SessionLocal, engine
+
+MERCHANTS = [
+    "Starbucks", "Uber trip", "Netflix", "Shell fuel", "Amazon purchase", "Whole Foods",
+    "Spotify", "CVS pharmacy", "AMC movie", "Landlord rent", "City water bill", "Delta flight",
+    "Marriott hotel", "Coursera course", "Dr Smith clinic", "Lyft ride", "Chipotle lunch",
+    "Zara clothes", "Comcast internet", "Airbnb stay", "Campus bookstore", "Steam game",
+    "Metro bus pass", "Verizon phone", "Target", "IKEA", "Dentist", "Gym membership",
+]
+
+
+def make_notes(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [f"{rng.choice(MERCHANTS)} #{rng.randrange(10000)}" for _ in range(count)]
+
+
+def run(label: str, server, categorize, notes: list) -> tuple:
+    requests_before = server.requests_served
+    started = time.perf_counter()
+    categories = categorize(notes)
+    elapsed = time.perf_counter() - started
+    return label, elapsed, server.requests_served - requests_before, categories
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub model latency in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    server = start_stub(latency=args.latency)
+    ai_service.OPENAI_BASE_URL = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    models.Base.metadata.create_all(bind=engine, tables=[models.CategorizationCache.__table__])
+
+    notes = make_notes(args.notes, args.seed)
+    keys = sorted({ai_service.normalize_note(note) for note in notes})
+    db = SessionLocal()
+    try:
+        db.query(models.CategorizationCache).filter(models.CategorizationCache.note_key.in_(keys)).delete()
+        db.commit()
+        ai_service.category_cache.clear()
+
+        results = [run(
+            "one call per note", server,
+            lambda notes: [ai_service._model_categories([note])[0] for note in notes], notes,
+        )]
+        results.append(run("batched, cold cache", server, lambda notes: ai_service.categorize_expenses(notes, db), notes))
+        ai_service.category_cache.clear()
+        results.append(run("database cache", server, lambda notes: ai_service.categorize_expenses(notes, db), notes))
+        results.append(run("in-process cache", server, lambda notes: ai_service.categorize_expenses(notes, db), notes))
+    finally:
+        db.close()
+
+    print(f"{len(notes)} notes, {len(keys)} distinct after normalizing, {args.latency * 1000:.0f} ms model latency\n")
+    print(f"{'scenario':<22}{'seconds':>10}{'model calls':>14}{'notes/s':>12}")
+    for label, elapsed, calls, _ in results:
+        print(f"{label:<22}{elapsed:>10.3f}{calls:>14}{len(notes) / elapsed:>12,.0f}")
+
+    # The cached paths must agree with what the model said
+    baseline = results[0][3]
+    mismatched = [label for label, _, _, categories in results[1:] if categories != baseline]
+    for label in mismatched:
+        print(f"MISMATCH: {label} returned different categories")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
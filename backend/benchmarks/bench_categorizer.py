@@ -0,0 +1,116 @@
+"""Rule-based categorization throughput: chained substring scans vs. the automaton.
+
+The previous ai_service.rule_based_categorization, which tests every keyword
+of every category with `in`, is kept here as the baseline.  Both are run over
+the same synthetic import notes, first with the default keyword table and then
+with a few hundred extra per-user rules, the case where the chained scans
+slow down with every keyword added.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_categorizer [--notes 100000]
+"""
+import argparse
+import random
+import time
+
+import categorizer
+
+WORDS = [
+    "Starbucks", "coffee", "Uber", "trip", "Netflix", "Amazon", "order", "Shell", "fuel",
+    "Walmart", "groceries", "rent", "October", "dinner", "with", "Sam", "pharmacy",
+    "AMC", "movie", "tickets", "internet", "bill", "Delta", "flight", "hotel", "refund",
+    "transfer", "POS", "purchase", "card", "payment", "Target", "IKEA", "gym",
+]
+
+
+def legacy_rule_based_categorization(note: str) -> str:
+    """ai_service.rule_based_categorization before the automaton, kept as the baseline"""
+    note = note.lower()
+    if any(word in note for word in ["food", "restaurant", "meal", "lunch", "dinner", "breakfast", "cafe", "coffee"]):
+        return "Food"
+    elif any(word in note for word in ["transport", "uber", "taxi", "bus", "train", "gas", "fuel", "car"]):
+        return "Transport"
+    elif any(word in note for word in ["rent", "house", "apartment", "mortgage"]):
+        return "Housing"
+    elif any(word in note for word in ["electricity", "water", "internet", "phone", "bill"]):
+        return "Utilities"
+    elif any(word in note for word in ["movie", "game", "concert", "show", "theater", "netflix", "spotify"]):
+        return "Entertainment"
+    elif any(word in note for word in ["clothes", "shoes", "mall", "amazon", "online", "purchase"]):
+        return "Shopping"
+    elif any(word in note for word in ["doctor", "medicine", "hospital", "health", "medical", "pharmacy"]):
+        return "Health"
+    elif any(word in note for word in ["school", "college", "university", "course", "class", "book", "tuition"]):
+        return "Education"
+    elif any(word in note for word in ["hotel", "flight", "vacation", "trip", "travel", "airbnb"]):
+        return "Travel"
+    else:
+        return "Other"
+
+
+def make_notes(rng: random.Random, count: int) -> list:
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))) + f" #{rng.randrange(100000)}"
+        for _ in range(count)
+    ]
+
+
+def make_user_rules(rng: random.Random, count: int) -> list:
+    """Merchant-style keywords, e.g. "store 4821", that rarely match"""
+    return [(f"store {rng.randrange(100000)}", "Shopping") for _ in range(count)]
+
+
+def chained_scan(rules: list, default_category: str):
+    """The any(word in note) approach generalised to a rule list"""
+    def categorize(note: str) -> str:
+        note = note.lower()
+        for keyword, category in rules:
+            if keyword in note:
+                return category
+        return default_category
+    return categorize
+
+
+def timed(categorize, notes: list) -> tuple:
+    started = time.perf_counter()
+    categories = [categorize(note) for note in notes]
+    return categories, time.perf_counter() - started
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--user-rules", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    notes = make_notes(rng, args.notes)
+    default_rules, default_category = categorizer.load_keyword_table()
+    user_rules = make_user_rules(rng, args.user_rules)
+
+    started = time.perf_counter()
+    defaults = categorizer.default_categorizer()
+    with_overrides = categorizer.Categorizer(defaults.defaults, default_category, categorizer.KeywordMatcher(user_rules))
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    scenarios = [
+        ("default table", legacy_rule_based_categorization, defaults.categorize),
+        (f"+{len(user_rules)} user rules", chained_scan(user_rules + default_rules, default_category), with_overrides.categorize),
+    ]
+    print(f"{len(notes)} notes, automata compiled in {compile_ms:.1f} ms\n")
+    print(f"{'scenario':<22}{'chained scans/s':>18}{'automaton/s':>16}{'speedup':>10}")
+    mismatched = False
+    for label, baseline, candidate in scenarios:
+        expected, baseline_seconds = timed(baseline, notes)
+        actual, candidate_seconds = timed(candidate, notes)
+        print(f"{label:<22}{len(notes) / baseline_seconds:>18,.0f}{len(notes) / candidate_seconds:>16,.0f}"
+              f"{baseline_seconds / candidate_seconds:>9.1f}x")
+        if actual != expected:
+            mismatched = True
+            print(f"MISMATCH: {label}: {sum(a != b for a, b in zip(actual, expected))} notes categorized differently")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""Login latency under concurrent load, with bcrypt inline vs. on the hash pool.
+
+Two copies of the /token password check are mounted on a throwaway app: an
+async route that verifies the password directly on the event loop (the old
+behaviour), and a sync route calling auth.verify_password_pooled, which is how
+/token runs now.  Concurrent logins are fired at each one alongside a stream
+of trivial requests, which shows how much every other request on the worker
+is held up while bcrypt runs.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_login [--logins 64] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+import auth
+from benchmarks.stats import format_table, summarize
+
+PASSWORD = "correct horse battery staple"
+
+
+def build_app(hashed_password: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/token/inline")
+    async def login_inline():
+        if not auth.verify_password(PASSWORD, hashed_password):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @app.post("/token/pooled")
+    def login_pooled():
+        if not auth.verify_password_pooled(PASSWORD, hashed_password):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def _timed(client: httpx.AsyncClient, method: str, url: str, samples: list, scheduled_at: float = None) -> None:
+    started = time.perf_counter() if scheduled_at is None else scheduled_at
+    response = await client.request(method, url)
+    response.raise_for_status()
+    samples.append((time.perf_counter() - started) * 1000)
+
+
+async def run_scenario(app: FastAPI, login_path: str, logins: int, concurrency: int, ping_interval: float = 0.01) -> dict:
+    login_samples, ping_samples = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def login():
+            async with semaphore:
+                await _timed(client, "POST", login_path, login_samples)
+
+        async def pinger():
+            # Requests are due on a fixed schedule and timed from when they
+            # were due, so time spent waiting for a blocked loop is counted
+            scheduled_at = time.perf_counter()
+            while not done.is_set():
+                scheduled_at += ping_interval
+                await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+                await _timed(client, "GET", "/ping", ping_samples, scheduled_at)
+                scheduled_at = max(scheduled_at, time.perf_counter() - ping_interval)
+
+        ping_task = asyncio.create_task(pinger())
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ping_task
+
+    return {
+        "login": summarize(login_samples),
+        "ping": summarize(ping_samples),
+        "logins_per_second": logins / elapsed,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    hashed_password = auth.get_password_hash(PASSWORD)
+    app = build_app(hashed_password)
+
+    rows = []
+    for label, path in [("inline (before)", "/token/inline"), ("pooled (after)", "/token/pooled")]:
+        result = asyncio.run(run_scenario(app, path, args.logins, args.concurrency))
+        rows.append((f"{label} login", result["login"]))
+        rows.append((f"{label} other requests", result["ping"]))
+        print(f"{label}: {result['logins_per_second']:.1f} logins/s")
+
+    print(f"\n{args.logins} logins, concurrency {args.concurrency}, {auth.PASSWORD_HASH_WORKERS} hash workers\n")
+    print(format_table(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""Receipt text parsing throughput and accuracy on the fixture corpus.
+
+Every receipt in benchmarks/fixtures/receipts is parsed with
+utils.parse_receipt_text and compared field by field with expected.json, then
+the corpus is parsed repeatedly to measure throughput.  The previous
+multi-pass parser is kept here for comparison.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_receipt_parser [--iterations 2000]
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.stats import format_table, summarize
+from utils import parse_receipt_text
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "receipts")
+
+
+def legacy_parse_receipt_text(text: str) -> dict:
+    """The parser before the single-pass rewrite, kept as the baseline"""
+    lines = text.split('\n')
+    amount = None
+    date = None
+    merchant = None
+
+    for line in lines:
+        line = line.lower()
+        if 'total' in line and not amount:
+            import re
+            numbers = re.findall(r'\d+\.\d+', line)
+            if numbers:
+                amount = float(numbers[-1])
+
+    for line in lines:
+        import re
+        date_patterns = [
+            r'\d{1,2}/\d{1,2}/\d{2,4}',
+            r'\d{1,2}-\d{1,2}-\d{2,4}',
+            r'\d{1,2}\.\d{1,2}\.\d{2,4}'
+        ]
+        for pattern in date_patterns:
+            match = re.search(pattern, line)
+            if match and not date:
+                date_str = match.group(0)
+                try:
+                    from dateutil import parser
+                    date = parser.parse(date_str)
+                    break
+                except:
+                    continue
+
+    if lines and not merchant:
+        start_idx = 0
+        while start_idx < len(lines) and not lines[start_idx].strip():
+            start_idx += 1
+        if start_idx < len(lines):
+            merchant = lines[start_idx].strip()
+
+    return {
+        "amount": amount,
+        "date": date.isoformat() if date else None,
+        "merchant": merchant
+    }
+
+
+def load_corpus():
+    with open(os.path.join(FIXTURE_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    corpus = {}
+    for name in expected:
+        with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+            corpus[name] = f.read()
+    return corpus, expected
+
+
+def accuracy(parse, corpus: dict, expected: dict) -> dict:
+    """Fraction of receipts whose amount, date and merchant match, plus field mismatches"""
+    correct = 0
+    mismatches = []
+    for name, text in corpus.items():
+        result = parse(text)
+        wrong = [key for key in ("amount", "date", "merchant") if result.get(key) != expected[name][key]]
+        if not wrong:
+            correct += 1
+        mismatches.extend(f"{name}: {key} = {result.get(key)!r}, expected {expected[name][key]!r}" for key in wrong)
+    return {"correct": correct, "total": len(corpus), "mismatches": mismatches}
+
+
+def time_parser(parse, texts: list, iterations: int) -> tuple:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            t0 = time.perf_counter()
+            parse(text)
+            samples.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    return summarize(samples), len(samples) / elapsed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="passes over the corpus")
+    args = parser.parse_args(argv)
+
+    corpus, expected = load_corpus()
+    texts = list(corpus.values())
+
+    # Every field of the current parser must match the fixtures exactly
+    failures = [name for name, text in corpus.items() if parse_receipt_text(text) != expected[name]]
+    for name in failures:
+        print(f"MISMATCH {name}: {json.dumps(parse_receipt_text(corpus[name]), ensure_ascii=False)}")
+
+    rows = []
+    for label, parse in [("legacy parser", legacy_parse_receipt_text), ("single-pass parser", parse_receipt_text)]:
+        result = accuracy(parse, corpus, expected)
+        summary, per_second = time_parser(parse, texts, args.iterations)
+        rows.append((label, summary))
+        print(f"{label}: {result['correct']}/{result['total']} receipts with correct amount, date and merchant, "
+              f"{per_second:,.0f} receipts/s")
+
+    print(f"\n{len(texts)} fixture receipts x {args.iterations} passes\n")
+    print(format_table(rows))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers categorization prompts from ai_service with rule-based categories
+and any other prompt (e.g. savings tips) with a fixed numbered list, after an
+optional artificial delay, and counts the requests it served.
+Point the API at it to exercise AI categorization without a key or network:
+
+    python -m benchmarks.openai_stub --port 8765 --latency 0.3
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ai_service import rule_based_categorization
+
+NUMBERED_LINE_RE = re.compile(r"^\d+\. (.*)$", re.MULTILINE)
+
+STUB_TIPS = [
+    "Set a weekly limit for your top category",
+    "Review recurring charges once a month",
+    "Compare prices before large purchases",
+]
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.requests_served = 0
+        self.notes_served = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = body["messages"][-1]["content"]
+        notes = NUMBERED_LINE_RE.findall(prompt)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server._lock:
+            self.server.requests_served += 1
+            self.server.notes_served += len(notes)
+
+        if notes:
+            content = json.dumps([rule_based_categorization(note) for note in notes])
+        else:
+            content = "\n".join(f"{i}. {tip}" for i, tip in enumerate(STUB_TIPS, start=1))
+        payload = json.dumps({
+            "id": f"chatcmpl-stub-{self.server.requests_served}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int = 0, latency: float = 0.0) -> StubServer:
+    """Serve the stub on a background thread; port 0 picks a free port"""
+    server = StubServer(("127.0.0.1", port), latency)
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    args = parser.parse_args(argv)
+    server = StubServer(("127.0.0.1", args.port), args.latency)
+    print(f"serving {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
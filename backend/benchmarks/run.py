@@ -0,0 +1,293 @@
+"""Time every auth, expense, budget and analytics route against a seeded database.
+
+Requests go through the real FastAPI app in-process (httpx's ASGI transport),
+so the numbers include routing, validation, dependencies and SQL but no
+network.  Each request is made as one of the users created by
+benchmarks.seed, taken in turn, so caches see a realistic mix of users.
+
+The report lists p50/p95/p99 latency per route.  --save writes it as JSON;
+--baseline compares the run against a saved report and, with
+--fail-threshold, exits non-zero when a route's p95 regressed by more than
+that percentage.
+
+Usage (from the backend directory, with DATABASE_URL pointing at the seeded
+database):
+    python -m benchmarks.run [--iterations 50] [--users 10] [--only analytics]
+        [--save results.json] [--baseline baseline.json] [--fail-threshold 20]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import select
+
+import budget_tracking
+import database
+import models
+from benchmarks.seed import BENCH_EMAIL_TEMPLATE, BENCH_PASSWORD
+from benchmarks.stats import format_table, summarize
+
+# Marks rows written by the benchmark so they can be removed afterwards
+BENCH_NOTE = "benchmark-run"
+
+
+@dataclass
+class BenchUser:
+    email: str
+    headers: Dict[str, str]
+    expense_ids: List[int] = field(default_factory=list)
+    budget_ids: List[int] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    created_expense_ids: List[int] = field(default_factory=list)
+
+
+@dataclass
+class Route:
+    name: str
+    method: str
+    # Builds the request for a user: returns (path, keyword arguments for httpx)
+    build: Callable[[BenchUser, int], tuple]
+    # Called with the user and response, e.g. to remember created ids
+    after: Optional[Callable[[BenchUser, httpx.Response], None]] = None
+    iterations: Optional[int] = None
+    # Name of a route that must run first, e.g. the POST that creates what a PUT edits
+    requires: Optional[str] = None
+
+
+def _expense_body(i: int) -> dict:
+    return {"amount": 10.0 + i % 50, "category": "Food", "note": BENCH_NOTE, "tags": ["benchmark"]}
+
+
+def _remember_created(user: BenchUser, response: httpx.Response) -> None:
+    user.created_expense_ids.append(response.json()["id"])
+
+
+def _import_file(i: int) -> bytes:
+    lines = ["amount,category,note,date"]
+    lines += [f"{5 + n % 20},Groceries,{BENCH_NOTE},{datetime.now().isoformat()}" for n in range(100)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _next_page_params(user: BenchUser) -> dict:
+    # A user with a single page has no cursor, and an empty one is rejected
+    params = {"limit": 50}
+    if user.next_cursor:
+        params["cursor"] = user.next_cursor
+    return params
+
+
+def _pop_created(user: BenchUser) -> int:
+    return user.created_expense_ids.pop()
+
+
+def build_routes(login_iterations: int, include_async: bool) -> List[Route]:
+    routes = [
+        Route("POST /token", "POST", lambda u, i: ("/token", {
+            "data": {"username": u.email, "password": BENCH_PASSWORD},
+        }), iterations=login_iterations),
+        Route("GET /users/me/", "GET", lambda u, i: ("/users/me/", {})),
+
+        Route("GET /expenses/", "GET", lambda u, i: ("/expenses/", {"params": {"limit": 50}})),
+        Route("GET /expenses/ (next page)", "GET", lambda u, i: ("/expenses/", {"params": _next_page_params(u)})),
+        Route("GET /expenses/ (category filter)", "GET", lambda u, i: ("/expenses/", {"params": {"limit": 50, "category": "Food"}})),
+        Route("GET /expenses/{id}", "GET", lambda u, i: (f"/expenses/{u.expense_ids[i % len(u.expense_ids)]}", {})),
+        Route("POST /expenses/", "POST", lambda u, i: ("/expenses/", {"json": _expense_body(i)}), after=_remember_created),
+        Route("PUT /expenses/{id}", "PUT", lambda u, i: (f"/expenses/{u.created_expense_ids[i % len(u.created_expense_ids)]}", {
+            "json": {"amount": 20.0 + i % 50},
+        }), requires="POST /expenses/"),
+        Route("DELETE /expenses/{id}", "DELETE", lambda u, i: (f"/expenses/{_pop_created(u)}", {}), requires="POST /expenses/"),
+        Route("POST /expenses/import (100 rows)", "POST", lambda u, i: ("/expenses/import", {
+            "files": {"file": ("expenses.csv", _import_file(i), "text/csv")},
+        })),
+        Route("GET /expenses/export", "GET", lambda u, i: ("/expenses/export", {"params": {"format": "csv"}})),
+
+        Route("GET /budgets/", "GET", lambda u, i: ("/budgets/", {})),
+        Route("GET /budgets/{id}", "GET", lambda u, i: (f"/budgets/{u.budget_ids[i % len(u.budget_ids)]}", {})),
+
+        Route("GET /analytics/category", "GET", lambda u, i: ("/analytics/category", {})),
+        Route("GET /analytics/summary", "GET", lambda u, i: ("/analytics/summary", {})),
+        Route("GET /analytics/category-breakdown", "GET", lambda u, i: ("/analytics/category-breakdown", {})),
+        Route("GET /analytics/category-breakdown (year)", "GET", lambda u, i: ("/analytics/category-breakdown", {"params": {"time_range": "year"}})),
+        Route("GET /analytics/daily", "GET", lambda u, i: ("/analytics/daily", {})),
+        Route("GET /analytics/monthly-trends", "GET", lambda u, i: ("/analytics/monthly-trends", {})),
+        Route("GET /analytics/monthly-trends (36, category)", "GET", lambda u, i: ("/analytics/monthly-trends", {
+            "params": {"months": 36, "split_by": "category"},
+        })),
+        Route("GET /analytics/person", "GET", lambda u, i: ("/analytics/person", {})),
+        Route("GET /analytics/wallet-distribution", "GET", lambda u, i: ("/analytics/wallet-distribution", {})),
+        Route("GET /ai/budget-suggestions", "GET", lambda u, i: ("/ai/budget-suggestions", {})),
+        Route("GET /ai/savings-tips", "GET", lambda u, i: ("/ai/savings-tips", {})),
+    ]
+    if include_async:
+        for path in [
+            "/analytics/summary", "/analytics/category-breakdown", "/analytics/monthly-trends",
+            "/analytics/wallet-distribution", "/analytics/dashboard",
+        ]:
+            routes.append(Route(f"GET /async{path}", "GET", lambda u, i, path=path: (f"/async{path}", {})))
+    return routes
+
+
+async def _login(client: httpx.AsyncClient, email: str) -> BenchUser:
+    response = await client.post("/token", data={"username": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    user = BenchUser(email=email, headers={"Authorization": f"Bearer {response.json()['access_token']}"})
+
+    response = await client.get("/expenses/", params={"limit": 50}, headers=user.headers)
+    response.raise_for_status()
+    user.expense_ids = [expense["id"] for expense in response.json()]
+    user.next_cursor = response.headers.get("X-Next-Cursor")
+    response = await client.get("/budgets/", headers=user.headers)
+    response.raise_for_status()
+    user.budget_ids = [budget["id"] for budget in response.json()]
+    if not user.expense_ids or not user.budget_ids:
+        raise SystemExit(f"{email} has no expenses or budgets; run benchmarks.seed first")
+    return user
+
+
+async def run_route(client: httpx.AsyncClient, route: Route, users: List[BenchUser], iterations: int, concurrency: int) -> dict:
+    samples: List[float] = []
+    user_cycle = itertools.cycle(users)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int, user: BenchUser) -> None:
+        path, kwargs = route.build(user, i)
+        headers = {**user.headers, **kwargs.pop("headers", {})}
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(route.method, path, headers=headers, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f"{route.name}: HTTP {response.status_code} {response.text[:200]}")
+        samples.append(elapsed)
+        if route.after:
+            route.after(user, response)
+
+    # Writes that depend on earlier ones (PUT/DELETE after POST) need every
+    # user to be visited in the same order, so requests are built in sequence
+    await asyncio.gather(*(one(i, next(user_cycle)) for i in range(route.iterations or iterations)))
+    return summarize(samples)
+
+
+def cleanup() -> int:
+    """Delete expenses the run created and restore budget totals"""
+    db = database.SessionLocal()
+    try:
+        user_ids = select(models.User.id).where(models.User.email.like(BENCH_EMAIL_TEMPLATE.format("%")))
+        deleted = db.execute(
+            models.Expense.__table__.delete().where(
+                models.Expense.user_id.in_(user_ids), models.Expense.note == BENCH_NOTE,
+            )
+        ).rowcount
+        db.commit()
+        budget_tracking.rebuild_budget_amounts(db)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+async def run(args) -> dict:
+    # Imported here so the app (and its engine) is only built for an actual run
+    import main
+
+    all_routes = build_routes(args.login_iterations, database.ASYNC_DATABASE_ENABLED)
+    selected = {
+        route.name for route in all_routes
+        if not args.only or any(pattern in route.name for pattern in args.only)
+    }
+    selected |= {route.requires for route in all_routes if route.name in selected and route.requires}
+    routes = [route for route in all_routes if route.name in selected]
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        users = [await _login(client, BENCH_EMAIL_TEMPLATE.format(n)) for n in range(1, args.users + 1)]
+        for route in routes:
+            # One untimed pass per user warms connections, caches and plans
+            if args.warmup and route.method == "GET":
+                for i, user in enumerate(users):
+                    path, kwargs = route.build(user, i)
+                    await client.request(route.method, path, headers={**user.headers, **kwargs.pop("headers", {})}, **kwargs)
+            results[route.name] = await run_route(client, route, users, args.iterations, args.concurrency)
+            print(f"  {route.name}: p50 {results[route.name]['p50']:.2f} ms", file=sys.stderr)
+    print(f"removed {cleanup()} benchmark expenses", file=sys.stderr)
+    return results
+
+
+def _change(current: float, baseline: float) -> str:
+    if not baseline:
+        return "n/a"
+    return f"{(current - baseline) / baseline * 100:+.1f}%"
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], fail_threshold: Optional[float]) -> List[str]:
+    """Print current vs. baseline percentiles and return the routes that regressed"""
+    width = max(len(name) for name in results)
+    print(f"\n{'name':<{width}}  {'p50 ms':>17}  {'p95 ms':>17}  {'p99 ms':>17}  {'p95 change':>10}")
+    regressions = []
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<{width}}  (not in baseline)")
+            continue
+        cells = "  ".join(f"{before[key]:>8.2f}→{summary[key]:<8.2f}" for key in ("p50", "p95", "p99"))
+        change = _change(summary["p95"], before["p95"])
+        flag = ""
+        if fail_threshold is not None and before["p95"] and (summary["p95"] - before["p95"]) / before["p95"] * 100 > fail_threshold:
+            regressions.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:<{width}}  {cells}  {change:>10}{flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--login-iterations", type=int, default=10, help="timed logins; bcrypt makes these slow")
+    parser.add_argument("--users", type=int, default=10, help="number of seeded users to spread requests over")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once per route")
+    parser.add_argument("--only", action="append", help="only run routes whose name contains this text (repeatable)")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--save", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a report saved with --save")
+    parser.add_argument("--fail-threshold", type=float, help="exit 1 if any p95 is this many percent above the baseline")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    print(f"\n{args.iterations} requests per route, {args.users} users, concurrency {args.concurrency}, "
+          f"{database.engine.dialect.name}\n")
+    print(format_table(list(results.items())))
+
+    if args.save:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "database": database.engine.dialect.name,
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "routes": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nsaved report to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+        regressions = compare(results, baseline, args.fail_threshold)
+        if regressions:
+            print(f"\n{len(regressions)} route(s) regressed by more than {args.fail_threshold}% at p95")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,189 @@
+"""Bulk-seed a database with synthetic users, wallets, people, budgets and expenses.
+
+The target is whatever DATABASE_URL points at, PostgreSQL or SQLite, e.g.
+    DATABASE_URL=sqlite:///./bench.db
+Rows are generated from a fixed random seed, so two runs with the same
+arguments produce the same data set.  Expenses are written with one
+executemany per chunk and spread over the last --years years, which is enough
+to seed millions of rows in a few minutes on a laptop.
+
+Every seeded user is named bench-user-<n>@example.com and has the password
+BENCH_PASSWORD; benchmarks.run logs in as them.
+
+Usage (from the backend directory):
+    python -m benchmarks.seed [--users 100] [--expenses 1000000] [--reset]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import insert, select, text
+
+import auth
+import budget_tracking
+import models
+from database import SessionLocal, engine
+
+BENCH_PASSWORD = "benchmark-password"
+BENCH_EMAIL_TEMPLATE = "bench-user-{}@example.com"
+
+CATEGORIES = [
+    "Food", "Groceries", "Transport", "Rent", "Utilities", "Entertainment",
+    "Shopping", "Health", "Travel", "Education", "Subscriptions", "Other",
+]
+MERCHANTS = [
+    "Starbucks", "Walmart", "Uber", "Netflix", "Shell", "Amazon", "Whole Foods",
+    "Spotify", "Pharmacy", "Cinema", "Landlord", "Electric Co", "Gym",
+]
+TAGS = ["work", "family", "trip", "reimbursable", "gift", "online", "cash"]
+WALLET_NAMES = ["Cash", "Checking", "Credit Card", "Savings", "Travel Card"]
+PERSON_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley"]
+
+
+def reset_bench_data(db) -> None:
+    """Delete everything previously created by this script"""
+    user_ids = select(models.User.id).where(models.User.email.like(BENCH_EMAIL_TEMPLATE.format("%")))
+    wallet_ids = select(models.Wallet.id).where(models.Wallet.owner_id.in_(user_ids))
+    budget_ids = select(models.Budget.id).where(models.Budget.user_id.in_(user_ids))
+    expense_ids = select(models.Expense.id).where(models.Expense.user_id.in_(user_ids))
+    for statement in [
+        models.RecurringExpense.__table__.delete().where(models.RecurringExpense.expense_id.in_(expense_ids)),
+        models.Alert.__table__.delete().where(models.Alert.budget_id.in_(budget_ids)),
+        models.Expense.__table__.delete().where(models.Expense.user_id.in_(user_ids)),
+        models.Budget.__table__.delete().where(models.Budget.user_id.in_(user_ids)),
+        models.Person.__table__.delete().where(models.Person.user_id.in_(user_ids)),
+        models.wallet_user_association.delete().where(models.wallet_user_association.c.wallet_id.in_(wallet_ids)),
+        models.Wallet.__table__.delete().where(models.Wallet.owner_id.in_(user_ids)),
+        models.UserSetting.__table__.delete().where(models.UserSetting.user_id.in_(user_ids)),
+        models.CategoryRule.__table__.delete().where(models.CategoryRule.user_id.in_(user_ids)),
+        models.UserClassifier.__table__.delete().where(models.UserClassifier.user_id.in_(user_ids)),
+        models.UserInsight.__table__.delete().where(models.UserInsight.user_id.in_(user_ids)),
+        models.ReceiptJob.__table__.delete().where(models.ReceiptJob.user_id.in_(user_ids)),
+        models.User.__table__.delete().where(models.User.id.in_(user_ids)),
+    ]:
+        db.execute(statement)
+    db.commit()
+
+
+def seed_users(db, count: int, start: int) -> List[int]:
+    # bcrypt is deliberately slow, so every user shares one hash
+    hashed_password = auth.get_password_hash(BENCH_PASSWORD)
+    emails = [BENCH_EMAIL_TEMPLATE.format(n) for n in range(start, start + count)]
+    db.execute(insert(models.User), [
+        {"name": f"Bench User {n}", "email": email, "hashed_password": hashed_password, "created_at": datetime.utcnow()}
+        for n, email in zip(range(start, start + count), emails)
+    ])
+    db.commit()
+    return list(db.scalars(select(models.User.id).where(models.User.email.in_(emails)).order_by(models.User.id)))
+
+
+def seed_owned_rows(db, model, owner_column: str, user_ids: List[int], per_user: int, make_row) -> Dict[int, List[int]]:
+    """Insert per_user rows of model for each user and return their ids by user"""
+    db.execute(insert(model), [
+        dict(make_row(i), **{owner_column: user_id}) for user_id in user_ids for i in range(per_user)
+    ])
+    db.commit()
+    owner = getattr(model, owner_column)
+    ids: Dict[int, List[int]] = {user_id: [] for user_id in user_ids}
+    for row_id, user_id in db.execute(select(model.id, owner).where(owner.in_(user_ids))):
+        ids[user_id].append(row_id)
+    return ids
+
+
+def expense_rows(rng: random.Random, user_ids: List[int], wallets: Dict[int, List[int]], people: Dict[int, List[int]], count: int, now: datetime, years: float):
+    """Yield expense rows spread evenly over users and the date range"""
+    span_seconds = int(years * 365 * 24 * 3600)
+    for i in range(count):
+        user_id = user_ids[i % len(user_ids)]
+        merchant = rng.choice(MERCHANTS)
+        person_index = rng.randrange(len(people[user_id])) if people[user_id] and rng.random() < 0.2 else None
+        yield {
+            "user_id": user_id,
+            "amount": round(rng.lognormvariate(3.0, 1.0), 2),
+            "category": rng.choice(CATEGORIES),
+            "date": now - timedelta(seconds=rng.randrange(span_seconds)),
+            "note": f"{merchant} #{rng.randrange(1000)}",
+            "person": PERSON_NAMES[person_index % len(PERSON_NAMES)] if person_index is not None else None,
+            "person_id": people[user_id][person_index] if person_index is not None else None,
+            "wallet_id": rng.choice(wallets[user_id]) if wallets[user_id] and rng.random() < 0.8 else None,
+            "is_recurring": False,
+            "tags": rng.sample(TAGS, rng.randint(1, 2)) if rng.random() < 0.3 else None,
+            "image_url": None,
+        }
+
+
+def seed(args) -> None:
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.reset:
+            reset_bench_data(db)
+        first_user = db.scalar(
+            select(models.User.id).where(models.User.email.like(BENCH_EMAIL_TEMPLATE.format("%"))).limit(1)
+        )
+        if first_user is not None:
+            raise SystemExit("Benchmark users already exist; pass --reset to replace them")
+
+        started = time.perf_counter()
+        user_ids = seed_users(db, args.users, 1)
+        wallets = seed_owned_rows(db, models.Wallet, "owner_id", user_ids, args.wallets_per_user, lambda i: {
+            "name": WALLET_NAMES[i % len(WALLET_NAMES)], "balance": 0.0,
+        })
+        people = seed_owned_rows(db, models.Person, "user_id", user_ids, args.people_per_user, lambda i: {
+            "name": PERSON_NAMES[i % len(PERSON_NAMES)],
+        })
+        seed_owned_rows(db, models.Budget, "user_id", user_ids, min(args.budgets_per_user, len(CATEGORIES)), lambda i: {
+            "category": CATEGORIES[i], "monthly_limit": float(rng.randrange(200, 2000, 50)),
+            "current_amount": 0.0, "start_date": now - timedelta(days=30),
+            "end_date": now + timedelta(days=365), "alert_threshold": 80.0,
+        })
+        print(f"seeded {len(user_ids)} users with wallets, people and budgets")
+
+        chunk: List[dict] = []
+        inserted = 0
+        for row in expense_rows(rng, user_ids, wallets, people, args.expenses, now, args.years):
+            chunk.append(row)
+            if len(chunk) >= args.chunk_size:
+                db.execute(insert(models.Expense), chunk)
+                db.commit()
+                inserted += len(chunk)
+                chunk = []
+                print(f"\r{inserted}/{args.expenses} expenses ({inserted / (time.perf_counter() - started):.0f} rows/s)", end="", flush=True)
+        if chunk:
+            db.execute(insert(models.Expense), chunk)
+            db.commit()
+            inserted += len(chunk)
+        print(f"\r{inserted}/{args.expenses} expenses")
+
+        budget_tracking.rebuild_budget_amounts(db, now=now)
+        db.commit()
+        # Fresh planner statistics, so plans match what a long-lived database would use
+        db.execute(text("ANALYZE"))
+        db.commit()
+        print(f"done in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--wallets-per-user", type=int, default=3)
+    parser.add_argument("--people-per-user", type=int, default=4)
+    parser.add_argument("--budgets-per-user", type=int, default=6)
+    parser.add_argument("--expenses", type=int, default=1_000_000, help="total expenses across all users")
+    parser.add_argument("--years", type=float, default=3.0, help="spread expense dates over this many years")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="delete earlier benchmark users and their data first")
+    args = parser.parse_args(argv)
+    seed(args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
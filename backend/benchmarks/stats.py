@@ -0,0 +1,34 @@
+"""Latency summaries shared by the benchmark scripts"""
+from typing import Dict, Iterable, List, Tuple
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples_ms: Iterable[float]) -> Dict[str, float]:
+    """Return count, p50, p95, p99 and max of latency samples in milliseconds"""
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def format_table(rows: List[Tuple[str, Dict[str, float]]]) -> str:
+    """Render (label, summary) pairs as a fixed-width table"""
+    width = max([len(label) for label, _ in rows] + [4])
+    lines = [f"{'name':<{width}}  {'count':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  {'max ms':>9}"]
+    for label, summary in rows:
+        lines.append(
+            f"{label:<{width}}  {summary['count']:>6}  {summary['p50']:>9.2f}  "
+            f"{summary['p95']:>9.2f}  {summary['p99']:>9.2f}  {summary['max']:>9.2f}"
+        )
+    return "\n".join(lines)
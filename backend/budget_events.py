@@ -0,0 +1,128 @@
+"""Budget alerts evaluated shortly after the expenses behind them change.
+
+Write paths call `publish(user_id, categories)` after committing.  Events are
+coalesced per (user, category) for BUDGET_EVENT_DEBOUNCE_SECONDS, then a
+background thread runs budget_tracking.evaluate_alerts for just those
+budgets, so a burst of edits costs one check and users see alerts within
+seconds instead of after the nightly job.  The same check marks the user's
+precomputed insights stale, so insights.py refreshes them in the background.
+
+The queue is per process and in memory: events still pending when a process
+is killed are lost.  BUDGET_ALERT_FULL_SCAN re-enables the nightly scan as a
+safety net for that case.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+import budget_tracking
+import insights
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# How long changes to one (user, category) are collected before it is checked
+DEBOUNCE_SECONDS = float(os.getenv("BUDGET_EVENT_DEBOUNCE_SECONDS", "2"))
+
+# First key of the two-part advisory lock serialising evaluation per user
+# across processes, so two workers can't both create the same alert
+ALERT_LOCK_NAMESPACE = 724002
+
+
+class BudgetEventQueue:
+    """Debounced (user, category) events drained by one worker thread"""
+
+    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        self._pending: Dict[Tuple[int, str], float] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def publish(self, user_id: int, categories: Iterable[Optional[str]]) -> None:
+        due = time.monotonic() + self.debounce_seconds
+        with self._condition:
+            for category in categories:
+                if category is None:
+                    continue
+                # Keep the earliest deadline so a steady stream of writes
+                # can't postpone the check indefinitely
+                self._pending.setdefault((user_id, category), due)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="budget-events", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _take_due(self, force: bool = False) -> Dict[int, Set[str]]:
+        now = time.monotonic()
+        due: Dict[int, Set[str]] = defaultdict(set)
+        for key, deadline in list(self._pending.items()):
+            if force or deadline <= now:
+                del self._pending[key]
+                due[key[0]].add(key[1])
+        return due
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    if self._pending:
+                        wait = min(self._pending.values()) - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+                due = self._take_due(force=self._stopping)
+                stopping = self._stopping
+            if due:
+                self._evaluate(due)
+            if stopping:
+                return
+
+    def _evaluate(self, due: Dict[int, Set[str]]) -> None:
+        db = SessionLocal()
+        try:
+            for user_id, categories in due.items():
+                try:
+                    if db.get_bind().dialect.name == "postgresql":
+                        db.execute(
+                            text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"),
+                            {"namespace": ALERT_LOCK_NAMESPACE, "user_id": user_id},
+                        )
+                    created = budget_tracking.evaluate_alerts(db, user_id=user_id, categories=categories)
+                    insights.mark_stale(db, user_id)
+                    db.commit()
+                    if created:
+                        logger.info("Created %d budget alert(s) for user %s", created, user_id)
+                except Exception:
+                    db.rollback()
+                    logger.exception("Budget alert check failed for user %s", user_id)
+        finally:
+            db.close()
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Check everything still pending now and stop the worker thread"""
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._condition.notify()
+        thread.join(timeout)
+
+
+queue = BudgetEventQueue()
+atexit.register(queue.drain, 10)
+
+
+def publish(user_id: int, categories: Iterable[Optional[str]]) -> None:
+    """Schedule an alert check for the user's budgets in these categories"""
+    queue.publish(user_id, categories)
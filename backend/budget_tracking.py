@@ -0,0 +1,287 @@
+"""Incremental maintenance of Budget.current_amount.
+
+Budgets track how much has been spent in their category during the current
+calendar month.  Instead of summing the expenses table every time budgets are
+read, the expense write paths push signed deltas into the matching budgets and
+`current_period_start` records which month the stored total belongs to.  A
+monthly job (and the `rebuild` command below) recomputes the totals from
+scratch so drift can always be repaired.
+
+`evaluate_alerts` finds the budgets over their alert threshold with one
+grouped query and inserts the missing alerts in bulk.
+
+Usage:
+    python budget_tracking.py verify [--user-id ID]
+    python budget_tracking.py rebuild [--user-id ID]
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from utils import add_months, month_start
+
+# Differences below this are treated as floating point noise by `verify`
+AMOUNT_TOLERANCE = 0.005
+
+# (category, expense date, signed amount)
+ExpenseDelta = Tuple[Optional[str], Optional[datetime], Optional[float]]
+
+
+def current_period(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Return the [start, end) bounds of the budget period containing now"""
+    start = month_start(now or datetime.now())
+    return start, add_months(start, 1)
+
+
+def _spent_in_period(period_start: datetime, period_end: datetime):
+    """Correlated subquery summing a budget's category spend for the period"""
+    return (
+        select(func.coalesce(func.sum(models.Expense.amount), 0.0))
+        .where(
+            models.Expense.user_id == models.Budget.user_id,
+            models.Expense.category == models.Budget.category,
+            models.Expense.date >= period_start,
+            models.Expense.date < period_end,
+        )
+        .scalar_subquery()
+    )
+
+
+def apply_expense_deltas(db: Session, user_id: int, changes: Iterable[ExpenseDelta], now: Optional[datetime] = None) -> None:
+    """Push expense changes into the user's budgets without committing.
+
+    Each change is a (category, date, signed amount) triple: positive for an
+    inserted expense, negative for a removed one, and one of each for an
+    update.  Changes dated outside the current month do not count towards any
+    budget and are dropped.  A budget whose stored total belongs to an older
+    month is recomputed instead of incremented, so the first write after a
+    month rollover is always correct.
+    """
+    period_start, period_end = current_period(now)
+    deltas: Dict[str, float] = defaultdict(float)
+    for category, expense_date, amount in changes:
+        if category is None or expense_date is None or not amount:
+            continue
+        # Offsets are dropped when stored in the naive DateTime column, so compare the same way
+        expense_date = expense_date.replace(tzinfo=None)
+        if period_start <= expense_date < period_end:
+            deltas[category] += amount
+
+    deltas = {category: delta for category, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    # The recompute branch reads the expenses table, so pending changes must be visible
+    db.flush()
+    for category, delta in deltas.items():
+        db.execute(
+            update(models.Budget)
+            .where(models.Budget.user_id == user_id, models.Budget.category == category)
+            .values(
+                current_amount=case(
+                    (
+                        models.Budget.current_period_start == period_start,
+                        func.coalesce(models.Budget.current_amount, 0.0) + delta,
+                    ),
+                    else_=_spent_in_period(period_start, period_end),
+                ),
+                current_period_start=period_start,
+            )
+            .execution_options(synchronize_session="fetch")
+        )
+
+
+def rebuild_budget_amounts(db: Session, user_id: Optional[int] = None, budget_ids: Optional[List[int]] = None, now: Optional[datetime] = None) -> int:
+    """Recompute current_amount from the expenses table without committing.
+
+    Returns the number of budgets updated.
+    """
+    period_start, period_end = current_period(now)
+    stmt = update(models.Budget).values(
+        current_amount=_spent_in_period(period_start, period_end),
+        current_period_start=period_start,
+    )
+    if user_id is not None:
+        stmt = stmt.where(models.Budget.user_id == user_id)
+    if budget_ids is not None:
+        stmt = stmt.where(models.Budget.id.in_(budget_ids))
+    result = db.execute(stmt.execution_options(synchronize_session="fetch"))
+    return result.rowcount
+
+
+def refresh_budget(db: Session, budget: models.Budget, now: Optional[datetime] = None) -> None:
+    """Recompute a single budget, e.g. after it was created or its category changed"""
+    db.flush()
+    rebuild_budget_amounts(db, budget_ids=[budget.id], now=now)
+
+
+def ensure_current_period(db: Session, budgets: List[models.Budget], now: Optional[datetime] = None) -> None:
+    """Roll over any of the given budgets still holding an older month's total.
+
+    This is a no-op on the common path; the monthly job normally resets every
+    budget before the first read of a new month.
+    """
+    period_start, _ = current_period(now)
+    stale_ids = [budget.id for budget in budgets if budget.current_period_start != period_start]
+    if not stale_ids:
+        return
+    rebuild_budget_amounts(db, budget_ids=stale_ids, now=now)
+    db.commit()
+    for budget in budgets:
+        if budget.id in stale_ids:
+            db.refresh(budget)
+
+
+def verify_budget_amounts(db: Session, user_id: Optional[int] = None, now: Optional[datetime] = None) -> List[dict]:
+    """Return budgets whose stored total disagrees with the expenses table"""
+    period_start, period_end = current_period(now)
+    actual = _spent_in_period(period_start, period_end).label("actual_amount")
+    stored = func.coalesce(models.Budget.current_amount, 0.0)
+    query = select(
+        models.Budget.id,
+        models.Budget.user_id,
+        models.Budget.category,
+        models.Budget.current_amount,
+        models.Budget.current_period_start,
+        actual,
+    ).where(
+        or_(
+            models.Budget.current_period_start.is_(None),
+            models.Budget.current_period_start != period_start,
+            func.abs(stored - actual) > AMOUNT_TOLERANCE,
+        )
+    )
+    if user_id is not None:
+        query = query.where(models.Budget.user_id == user_id)
+
+    return [
+        {
+            "budget_id": row.id,
+            "user_id": row.user_id,
+            "category": row.category,
+            "stored_amount": row.current_amount,
+            "stored_period_start": row.current_period_start,
+            "actual_amount": row.actual_amount,
+        }
+        for row in db.execute(query)
+    ]
+
+
+def _alert_message(category: str, monthly_limit: float, spent: float) -> str:
+    if spent > monthly_limit:
+        return f"Budget for {category} exceeded! Limit: {monthly_limit}, Spent: {spent}"
+    percent = spent / monthly_limit * 100 if monthly_limit else 100.0
+    return f"Budget for {category} is at {percent:.0f}% of its limit. Limit: {monthly_limit}, Spent: {spent}"
+
+
+def over_threshold_query(period_start: datetime, period_end: datetime, user_id: Optional[int] = None, categories: Optional[Iterable[str]] = None):
+    """Select active budgets whose spend this period reached alert_threshold and that have no alert yet.
+
+    Spend is summed over the part of the period inside the budget's own
+    start_date/end_date, in one grouped join of budgets to expenses.
+    """
+    window_start = case(
+        (models.Budget.start_date > period_start, models.Budget.start_date),
+        else_=period_start,
+    )
+    window_end = case(
+        (models.Budget.end_date < period_end, models.Budget.end_date),
+        else_=period_end,
+    )
+    spent = func.sum(models.Expense.amount)
+    threshold = func.coalesce(models.Budget.alert_threshold, 100.0)
+    already_alerted = (
+        select(models.Alert.id)
+        .where(models.Alert.budget_id == models.Budget.id, models.Alert.triggered_on >= period_start)
+        .exists()
+    )
+    query = (
+        select(
+            models.Budget.id,
+            models.Budget.user_id,
+            models.Budget.category,
+            models.Budget.monthly_limit,
+            spent.label("spent"),
+        )
+        .join(
+            models.Expense,
+            and_(
+                models.Expense.user_id == models.Budget.user_id,
+                models.Expense.category == models.Budget.category,
+                models.Expense.date >= window_start,
+                models.Expense.date < window_end,
+            ),
+        )
+        .where(
+            or_(models.Budget.start_date.is_(None), models.Budget.start_date < period_end),
+            or_(models.Budget.end_date.is_(None), models.Budget.end_date > period_start),
+            models.Budget.monthly_limit.is_not(None),
+            ~already_alerted,
+        )
+        .group_by(models.Budget.id)
+        .having(spent > 0, spent >= models.Budget.monthly_limit * threshold / 100.0)
+    )
+    if user_id is not None:
+        query = query.where(models.Budget.user_id == user_id)
+    if categories is not None:
+        query = query.where(models.Budget.category.in_(list(categories)))
+    return query
+
+
+def evaluate_alerts(db: Session, now: Optional[datetime] = None, user_id: Optional[int] = None, categories: Optional[Iterable[str]] = None) -> int:
+    """Create this period's alerts for budgets over their threshold without committing.
+
+    A budget gets at most one alert per period.  Returns the number of alerts
+    created.
+    """
+    now = now or datetime.now()
+    period_start, period_end = current_period(now)
+    alerts = [
+        {
+            "user_id": row.user_id,
+            "budget_id": row.id,
+            "triggered_on": now,
+            "message": _alert_message(row.category, row.monthly_limit, row.spent),
+        }
+        for row in db.execute(over_threshold_query(period_start, period_end, user_id, categories))
+    ]
+    if alerts:
+        db.execute(insert(models.Alert), alerts)
+    return len(alerts)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify or rebuild Budget.current_amount")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "verify":
+            mismatches = verify_budget_amounts(db, user_id=args.user_id)
+            for mismatch in mismatches:
+                print(
+                    f"budget {mismatch['budget_id']} ({mismatch['category']}): "
+                    f"stored {mismatch['stored_amount']} for {mismatch['stored_period_start']}, "
+                    f"actual {mismatch['actual_amount']}"
+                )
+            print(f"{len(mismatches)} budget(s) out of date")
+            return 1 if mismatches else 0
+
+        updated = rebuild_budget_amounts(db, user_id=args.user_id)
+        db.commit()
+        print(f"Rebuilt {updated} budget(s)")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,197 @@
+"""Keyword categorization of expense notes with a precompiled automaton.
+
+Keywords are matched as case-insensitive substrings of the note.  The default
+table is loaded from CATEGORY_KEYWORDS_PATH (category_keywords.json); when
+several keywords match, the category listed first in the table wins, and
+notes matching nothing get the table's default category.  Each user's rows in
+category_rules are checked before the defaults, longest keyword first.
+
+All keywords are compiled into one Aho-Corasick automaton, so a note is
+scanned once, character by character, however many keywords there are.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+
+CATEGORY_KEYWORDS_PATH = os.getenv(
+    "CATEGORY_KEYWORDS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_keywords.json"),
+)
+
+# Compiled per-user rule sets are cached per process; changes made through
+# the API are visible at once in the process that made them, and within
+# this many seconds everywhere else
+CATEGORY_RULES_CACHE_TTL_SECONDS = float(os.getenv("CATEGORY_RULES_CACHE_TTL_SECONDS", "60"))
+CATEGORY_RULES_CACHE_SIZE = 1000
+
+_NO_MATCH = float("inf")
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over (keyword, category) pairs in priority order"""
+
+    def __init__(self, rules: Iterable[Tuple[str, str]]):
+        self.categories: List[str] = []
+        # Transitions of the full automaton: failure links are folded in at
+        # build time, so matching never backtracks
+        self._next: List[Dict[str, int]] = [{}]
+        # Best (lowest) priority of any keyword ending at each state
+        self._output: List[float] = [_NO_MATCH]
+
+        for keyword, category in rules:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                following = self._next[state].get(char)
+                if following is None:
+                    following = len(self._next)
+                    self._next[state][char] = following
+                    self._next.append({})
+                    self._output.append(_NO_MATCH)
+                state = following
+            if self._output[state] == _NO_MATCH:
+                self._output[state] = len(self.categories)
+                self.categories.append(category)
+        self._compile()
+
+    def _compile(self) -> None:
+        trie = [dict(transitions) for transitions in self._next]
+        fail = [0] * len(trie)
+        order = []
+        queue = deque(trie[0].values())
+        # Breadth first, so a state's failure target (always shallower) is
+        # finished before the state itself
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, child in trie[state].items():
+                fallback = fail[state]
+                while fallback and char not in trie[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = trie[fallback].get(char, 0) if state else 0
+                self._output[child] = min(self._output[child], self._output[fail[child]])
+                queue.append(child)
+        # Fold the failure links into the transitions
+        for state in order:
+            for char, following in self._next[fail[state]].items():
+                self._next[state].setdefault(char, following)
+
+    def match(self, text: str) -> Optional[str]:
+        """Category of the highest-priority keyword found in text, if any"""
+        transitions = self._next
+        output = self._output
+        best = _NO_MATCH
+        state = 0
+        for char in text.lower():
+            state = transitions[state].get(char, 0)
+            if output[state] < best:
+                best = output[state]
+        return self.categories[best] if best != _NO_MATCH else None
+
+
+class Categorizer:
+    """User rules first, then the default keyword table"""
+
+    def __init__(self, defaults: KeywordMatcher, default_category: str, overrides: Optional[KeywordMatcher] = None):
+        self.defaults = defaults
+        self.default_category = default_category
+        self.overrides = overrides
+
+    def categorize(self, note: Optional[str]) -> str:
+        if not note:
+            return self.default_category
+        if self.overrides is not None:
+            category = self.overrides.match(note)
+            if category is not None:
+                return category
+        return self.defaults.match(note) or self.default_category
+
+    def categorize_many(self, notes: Iterable[Optional[str]]) -> List[str]:
+        return [self.categorize(note) for note in notes]
+
+
+def load_keyword_table(path: str = CATEGORY_KEYWORDS_PATH) -> Tuple[List[Tuple[str, str]], str]:
+    """(keyword, category) pairs in priority order and the fallback category"""
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    rules = [(keyword, entry["category"]) for entry in table["categories"] for keyword in entry["keywords"]]
+    return rules, table.get("default", "Other")
+
+
+_default_categorizer: Optional[Categorizer] = None
+_default_lock = threading.Lock()
+
+
+def default_categorizer() -> Categorizer:
+    """Categorizer for the default keyword table, compiled on first use"""
+    global _default_categorizer
+    with _default_lock:
+        if _default_categorizer is None:
+            rules, default_category = load_keyword_table()
+            _default_categorizer = Categorizer(KeywordMatcher(rules), default_category)
+        return _default_categorizer
+
+
+class UserCategorizerCache:
+    """Bounded LRU of compiled per-user categorizers with per-entry expiry"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Categorizer]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, categorizer = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return categorizer
+
+    def put(self, user_id: int, categorizer: Categorizer) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, categorizer)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_categorizers = UserCategorizerCache(CATEGORY_RULES_CACHE_SIZE, CATEGORY_RULES_CACHE_TTL_SECONDS)
+
+
+def categorizer_for_user(db: Session, user_id: int) -> Categorizer:
+    """The default categorizer with the user's own rules in front of it"""
+    categorizer = user_categorizers.get(user_id)
+    if categorizer is not None:
+        return categorizer
+    defaults = default_categorizer()
+    rules = db.execute(
+        select(models.CategoryRule.keyword, models.CategoryRule.category)
+        .where(models.CategoryRule.user_id == user_id)
+    ).all()
+    # Longest keyword first, so "uber eats" can override "uber"
+    rules = sorted(rules, key=lambda rule: -len(rule.keyword))
+    overrides = KeywordMatcher((rule.keyword, rule.category) for rule in rules) if rules else None
+    categorizer = Categorizer(defaults.defaults, defaults.default_category, overrides)
+    user_categorizers.put(user_id, categorizer)
+    return categorizer
@@ -0,0 +1,248 @@
+"""Bulk import and export of expenses as CSV or NDJSON files.
+
+On import, rows are read one at a time from the uploaded file, validated
+against schemas.ExpenseCreate and inserted in chunks with a single
+executemany per chunk.  Rows without a category but with a note are
+categorized from the note with the user's keyword rules.  Invalid rows are
+reported back with their line number and skipped; they never abort the rest
+of the file.
+
+Exports stream rows from a server-side cursor in fixed-size batches, so memory
+use does not depend on how many expenses the user has.  Both directions share
+the same column names and tag separator, so an export can be imported again.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import budget_events
+import budget_tracking
+import categorizer
+import models
+import schemas
+from database import SessionLocal
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+
+# Only the first errors are returned so a bad file can't produce a huge response
+MAX_REPORTED_ERRORS = 1000
+
+# Separator for the tags column in CSV files
+TAG_SEPARATOR = "|"
+
+# Rows fetched from the server-side cursor per round trip during export
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    "id", "date", "amount", "category", "note", "person",
+    "person_id", "wallet_id", "is_recurring", "tags", "image_url",
+]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# (line number, parsed row or the reason it could not be parsed)
+ParsedRow = Tuple[int, Union[dict, str]]
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    """Guess "csv" or "ndjson" from the upload's name and content type"""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or (content_type or "").endswith(("ndjson", "jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[ParsedRow]:
+    """Yield rows of a CSV file with a header line; empty cells become None"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        row = {key: (value if value != "" else None) for key, value in row.items() if key}
+        if row.get("tags") is not None:
+            row["tags"] = [tag.strip() for tag in row["tags"].split(TAG_SEPARATOR) if tag.strip()]
+        yield reader.line_num, row
+
+
+def iter_ndjson_rows(stream: BinaryIO) -> Iterator[ParsedRow]:
+    """Yield one JSON object per non-blank line"""
+    for line_num, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8-sig"), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, f"Invalid JSON: {e.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield line_num, "Expected a JSON object"
+            continue
+        yield line_num, row
+
+
+def _validation_messages(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" if detail["loc"] else detail["msg"]
+        for detail in error.errors()
+    ]
+
+
+class _ImportBatch:
+    """Accumulates validated rows and writes them one chunk at a time"""
+
+    def __init__(self, db: Session, user_id: int, chunk_size: int):
+        self.db = db
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.rows: List[Tuple[int, dict]] = []
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+
+    def add_error(self, line_num: int, messages: List[str]) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line_num, "errors": messages})
+
+    def add(self, line_num: int, values: dict) -> None:
+        self.rows.append((line_num, values))
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+
+        # Reject unknown wallets, and other users' wallets, per row rather than
+        # letting the FK fail the chunk or attaching rows to someone else's wallet
+        wallet_ids = {values["wallet_id"] for _, values in rows if values["wallet_id"] is not None}
+        if wallet_ids:
+            owned = set(self.db.scalars(
+                select(models.Wallet.id).where(models.Wallet.id.in_(wallet_ids), models.Wallet.owner_id == self.user_id)
+            ))
+            valid_rows = []
+            for line_num, values in rows:
+                if values["wallet_id"] is not None and values["wallet_id"] not in owned:
+                    self.add_error(line_num, [f"wallet_id: Wallet {values['wallet_id']} not found"])
+                else:
+                    valid_rows.append((line_num, values))
+            rows = valid_rows
+            if not rows:
+                return
+
+        try:
+            self.db.execute(insert(models.Expense), [values for _, values in rows])
+            budget_tracking.apply_expense_deltas(
+                self.db,
+                self.user_id,
+                [(values["category"], values["date"], values["amount"]) for _, values in rows],
+            )
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            message = f"Chunk rejected by the database: {e.__class__.__name__}"
+            for line_num, _ in rows:
+                self.add_error(line_num, [message])
+            return
+        self.inserted += len(rows)
+        budget_events.publish(self.user_id, {values["category"] for _, values in rows})
+
+
+def import_expenses(db: Session, user_id: int, rows: Iterator[ParsedRow], chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """Validate and insert parsed rows for a user, committing once per chunk"""
+    batch = _ImportBatch(db, user_id, chunk_size)
+    rules = categorizer.categorizer_for_user(db, user_id)
+    for line_num, row in rows:
+        if isinstance(row, str):
+            batch.add_error(line_num, [row])
+            continue
+        if not row.get("category") and isinstance(row.get("note"), str):
+            row["category"] = rules.categorize(row["note"])
+        try:
+            expense = schemas.ExpenseCreate(**row)
+        except ValidationError as e:
+            batch.add_error(line_num, _validation_messages(e))
+            continue
+
+        values = expense.dict()
+        values["user_id"] = user_id
+        # Column defaults don't apply to keys passed explicitly to executemany
+        if values["date"] is None:
+            values["date"] = datetime.utcnow()
+        if values["is_recurring"] is None:
+            values["is_recurring"] = False
+        batch.add(line_num, values)
+    batch.flush()
+
+    return {
+        "inserted": batch.inserted,
+        "failed": batch.failed,
+        "errors": batch.errors,
+        "errors_truncated": batch.failed > len(batch.errors),
+    }
+
+
+def export_query(filters: list):
+    """Select the export columns in (date, id) order, streamed from a server-side cursor"""
+    columns = [models.Expense.__table__.c[name] for name in EXPORT_COLUMNS]
+    return (
+        select(*columns)
+        .where(*filters)
+        .order_by(models.Expense.date, models.Expense.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return TAG_SEPARATOR.join(value)
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_export(filters: list, file_format: str) -> Iterator[str]:
+    """Yield the export file in chunks of EXPORT_BATCH_SIZE rows.
+
+    The generator owns its session: a StreamingResponse keeps consuming it
+    after the request's own session has been closed.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(export_query(filters))
+        if file_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+            for partition in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_csv_value(value) for value in row] for row in partition)
+                yield buffer.getvalue()
+        else:
+            for partition in result.partitions():
+                yield "".join(
+                    json.dumps({name: _json_value(value) for name, value in zip(EXPORT_COLUMNS, row)}) + "\n"
+                    for row in partition
+                )
+    finally:
+        db.close()
@@ -0,0 +1,90 @@
+"""Filtering and keyset pagination for expense listings.
+
+Expenses are listed newest first, ordered by (date, id).  A page cursor is the
+(date, id) of the last row returned, encoded as an opaque URL-safe string, so
+the next page starts with an index seek instead of an offset scan.  date is
+NOT NULL, so every row has a position in that order.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import String, select, tuple_, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY
+
+import models
+
+# Upper bound for a single page of GET /expenses/
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(date: datetime, expense_id: int) -> str:
+    """Encode the position after an expense as an opaque page cursor"""
+    raw = f"{date.isoformat()}|{expense_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a page cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_part, id_part = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def expense_filters(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    wallet_id: Optional[int] = None,
+    person: Optional[str] = None,
+    person_id: Optional[int] = None,
+    tag: Optional[str] = None,
+) -> list:
+    """WHERE conditions for the listing filters; None means unfiltered"""
+    conditions = [models.Expense.user_id == user_id]
+    if start is not None:
+        conditions.append(models.Expense.date >= start)
+    if end is not None:
+        conditions.append(models.Expense.date <= end)
+    if category is not None:
+        conditions.append(models.Expense.category == category)
+    if wallet_id is not None:
+        conditions.append(models.Expense.wallet_id == wallet_id)
+    if person is not None:
+        conditions.append(models.Expense.person == person)
+    if person_id is not None:
+        conditions.append(models.Expense.person_id == person_id)
+    if tag is not None:
+        # @> rather than = ANY() so the GIN index on tags can be used
+        conditions.append(type_coerce(models.Expense.tags, ARRAY(String)).contains([tag]))
+    return conditions
+
+
+def expense_page_query(filters: list, cursor: Optional[str] = None, limit: int = 100, skip: int = 0):
+    """Build a page of expenses, newest first.
+
+    One row more than `limit` is selected so the caller can tell whether a
+    further page exists.  `skip` is honoured only without a cursor, for
+    clients still paging by offset.
+    """
+    query = select(models.Expense).where(*filters)
+    if cursor is not None:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.where(tuple_(models.Expense.date, models.Expense.id) < tuple_(cursor_date, cursor_id))
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(models.Expense.date.desc(), models.Expense.id.desc()).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    """Trim the look-ahead row and return (page, next cursor or None)"""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.date, last.id)
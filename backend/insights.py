@@ -0,0 +1,154 @@
+"""Precomputed budget suggestions and savings tips, one user_insights row per user.
+
+/ai/budget-suggestions and /ai/savings-tips read the stored row instead of
+aggregating the user's whole history and calling the model on every request.
+Rows are (re)computed by scheduled jobs:
+
+- `refresh_insights()` nightly, for every user with expenses
+- `refresh_insights(stale_only=True)` every few minutes, for rows marked
+  stale after the user's expenses or budgets changed (budget_events does
+  this), at most once per INSIGHTS_MIN_REFRESH_SECONDS per user
+
+When the model is unavailable the suggestions are still refreshed, the
+previous tips are kept (the generic ones for a new row) and the row stays
+stale, so the next run tries again.  A user without a row yet gets one
+computed on the spot with the generic tips, and the model fills them in on
+the next refresh.
+
+Usage:
+    python insights.py refresh [--user-id ID] [--stale-only]
+"""
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+import ai_service
+import analytics
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# A stale row is not recomputed more often than this, which caps model calls
+# for users who keep editing expenses
+INSIGHTS_MIN_REFRESH_SECONDS = int(os.getenv("INSIGHTS_MIN_REFRESH_SECONDS", "600"))
+
+
+def compute_insights(db: Session, user_id: int, use_model: bool = True) -> dict:
+    """Suggestions and tips for a user as a user_insights row"""
+    suggestions = analytics.get_budget_suggestions(db, user_id)
+    # Suggestions are 1.2x the spend per category, so they rank categories the same way
+    tips = ai_service.savings_tips_for_totals(suggestions) if use_model and suggestions else None
+    return {
+        "user_id": user_id,
+        "budget_suggestions": suggestions,
+        "savings_tips": tips or list(ai_service.GENERIC_SAVINGS_TIPS),
+        "computed_at": datetime.utcnow(),
+        # Keep retrying the model until it has written this user's tips
+        "stale": bool(suggestions) and tips is None,
+    }
+
+
+def _insert(db: Session):
+    table = models.UserInsight.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def refresh_user(db: Session, user_id: int, use_model: bool = True) -> models.UserInsight:
+    """Recompute a user's row and commit it.
+
+    The stale flag is cleared and committed before anything is read, so an
+    expense change made while this runs marks the row stale again for the
+    next run rather than being overwritten.
+    """
+    db.execute(update(models.UserInsight).where(models.UserInsight.user_id == user_id).values(stale=False))
+    db.commit()
+    values = compute_insights(db, user_id, use_model)
+    # An existing row keeps its tips when the model failed, and a stale mark
+    # made meanwhile is never cleared here
+    changes = {"budget_suggestions": values["budget_suggestions"], "computed_at": values["computed_at"]}
+    if values["stale"]:
+        changes["stale"] = True
+    else:
+        changes["savings_tips"] = values["savings_tips"]
+    db.execute(_insert(db).values(**values).on_conflict_do_update(index_elements=["user_id"], set_=changes))
+    db.commit()
+    return db.get(models.UserInsight, user_id, populate_existing=True)
+
+
+def get_insights(db: Session, user_id: int) -> models.UserInsight:
+    """The stored insights for a user, computed without the model if there are none yet"""
+    insight = db.get(models.UserInsight, user_id)
+    if insight is None:
+        # An upsert, so concurrent first reads don't collide on the primary key
+        insight = refresh_user(db, user_id, use_model=False)
+    return insight
+
+
+def mark_stale(db: Session, user_id: int) -> None:
+    """Flag a user's insights for the next refresh run; the caller commits"""
+    db.execute(update(models.UserInsight).where(models.UserInsight.user_id == user_id).values(stale=True))
+
+
+def users_to_refresh(db: Session, stale_only: bool, now: datetime) -> List[int]:
+    if stale_only:
+        return list(db.scalars(
+            select(models.UserInsight.user_id).where(
+                models.UserInsight.stale.is_(True),
+                or_(
+                    models.UserInsight.computed_at.is_(None),
+                    models.UserInsight.computed_at < now - timedelta(seconds=INSIGHTS_MIN_REFRESH_SECONDS),
+                ),
+            )
+        ))
+    return list(db.scalars(select(models.Expense.user_id).distinct()))
+
+
+def refresh_insights(stale_only: bool = False, user_id: Optional[int] = None) -> int:
+    """Recompute insights, committing per user; returns how many were refreshed"""
+    db = SessionLocal()
+    try:
+        user_ids = [user_id] if user_id is not None else users_to_refresh(db, stale_only, datetime.utcnow())
+        refreshed = 0
+        for user_id in user_ids:
+            try:
+                # While the circuit is open only the suggestions are refreshed
+                refresh_user(db, user_id, use_model=not ai_service.model_breaker.is_open)
+                refreshed += 1
+            except Exception:
+                db.rollback()
+                logger.exception("Refreshing insights failed for user %s", user_id)
+                try:
+                    # refresh_user had already cleared the mark; retry on the next run
+                    mark_stale(db, user_id)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+        return refreshed
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute stored budget suggestions and savings tips")
+    parser.add_argument("command", choices=["refresh"])
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--stale-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    refreshed = refresh_insights(stale_only=args.stale_only, user_id=args.user_id)
+    print(f"Refreshed insights for {refreshed} user(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
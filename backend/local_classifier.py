@@ -0,0 +1,285 @@
+"""Per-user naive Bayes categorizer trained on the user's own expenses.
+
+Every expense with a note and a category is a labelled example.  Notes are
+reduced to hashed word and word-pair features, and a multinomial naive Bayes
+model keeps per-category feature counts, so training is incremental: a run
+only reads expenses newer than the last one it saw and adds their counts.
+Models are stored compressed in user_classifiers, one row per user, and kept
+in memory per process once loaded.  Prediction is a NumPy gather and sum over
+a handful of features, with no network involved.
+
+ai_service.categorize_expenses asks this model first and only falls back to
+the shared cache and the remote model when it isn't confident.  Edited or
+deleted expenses are not unlearned until the model is rebuilt.
+
+Usage:
+    python local_classifier.py train [--user-id ID]
+    python local_classifier.py rebuild [--user-id ID]
+"""
+import argparse
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+# Hashed feature space; collisions are rare for one user's vocabulary
+N_FEATURES = 2 ** 12
+
+# Additive (Laplace) smoothing of feature counts
+ALPHA = 1.0
+
+# A prediction is only used with at least this many training examples and
+# this posterior probability; anything less goes to the remote model
+MIN_EXAMPLES = int(os.getenv("LOCAL_CLASSIFIER_MIN_EXAMPLES", "20"))
+MIN_CONFIDENCE = float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.8"))
+
+# Loaded models kept in memory per process, and for how long before the
+# stored one is re-read (another process may have trained it since)
+MODEL_CACHE_SIZE = int(os.getenv("LOCAL_CLASSIFIER_CACHE_SIZE", "1000"))
+MODEL_CACHE_TTL_SECONDS = float(os.getenv("LOCAL_CLASSIFIER_CACHE_TTL_SECONDS", "300"))
+
+# Expenses read per query while training
+TRAIN_CHUNK_SIZE = 5000
+
+_WORD_RE = re.compile(r"[^\W\d_]{2,}")
+
+
+def note_features(note: Optional[str]) -> List[int]:
+    """Hashed feature indexes of a note's words and adjacent word pairs"""
+    words = _WORD_RE.findall((note or "").lower())
+    tokens = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    # crc32 rather than hash(), which differs between processes
+    return [zlib.crc32(token.encode()) % N_FEATURES for token in tokens]
+
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes over hashed note features"""
+
+    def __init__(self, categories: Optional[List[str]] = None, class_counts=None, feature_counts=None, last_expense_id: int = 0):
+        self.categories = list(categories or [])
+        self.class_counts = np.asarray(class_counts if class_counts is not None else [], dtype=np.float32)
+        self.feature_counts = (
+            feature_counts if feature_counts is not None
+            else np.zeros((len(self.categories), N_FEATURES), dtype=np.float32)
+        )
+        self.last_expense_id = last_expense_id
+        self._prepare()
+
+    @property
+    def examples(self) -> int:
+        return int(self.class_counts.sum())
+
+    def _prepare(self) -> None:
+        """Precompute the parts of the log-likelihood that don't depend on the note"""
+        if not self.categories:
+            return
+        self._log_prior = np.log(self.class_counts + ALPHA) - np.log(self.class_counts.sum() + ALPHA * len(self.categories))
+        self._log_denominator = np.log(self.feature_counts.sum(axis=1) + ALPHA * N_FEATURES)
+        self._seen = self.feature_counts.any(axis=0)
+
+    def learn(self, examples: Iterable[Tuple[str, str]]) -> int:
+        """Add (note, category) examples to the counts; returns how many were used"""
+        index = {category: i for i, category in enumerate(self.categories)}
+        rows, columns, labels = [], [], []
+        for note, category in examples:
+            features = note_features(note)
+            if not features:
+                continue
+            if category not in index:
+                index[category] = len(self.categories)
+                self.categories.append(category)
+            rows.extend([index[category]] * len(features))
+            columns.extend(features)
+            labels.append(index[category])
+        if not labels:
+            return 0
+
+        grow = len(self.categories) - len(self.class_counts)
+        if grow:
+            self.class_counts = np.concatenate([self.class_counts, np.zeros(grow, dtype=np.float32)])
+            self.feature_counts = np.vstack([self.feature_counts, np.zeros((grow, N_FEATURES), dtype=np.float32)])
+        np.add.at(self.class_counts, labels, 1)
+        np.add.at(self.feature_counts, (rows, columns), 1)
+        self._prepare()
+        return len(labels)
+
+    def predict(self, note: Optional[str]) -> Optional[Tuple[str, float]]:
+        """Most likely category and its posterior probability, or None for a note
+        with no feature the model has seen"""
+        if not self.categories:
+            return None
+        features = [feature for feature in note_features(note) if self._seen[feature]]
+        if not features:
+            return None
+        scores = (
+            self._log_prior
+            + np.log(self.feature_counts[:, features] + ALPHA).sum(axis=1)
+            - len(features) * self._log_denominator
+        )
+        best = int(scores.argmax())
+        probabilities = np.exp(scores - scores[best])
+        return self.categories[best], float(1.0 / probabilities.sum())
+
+    def to_row(self, user_id: int) -> dict:
+        return {
+            "user_id": user_id,
+            "categories": self.categories,
+            "class_counts": [int(count) for count in self.class_counts],
+            "feature_counts": zlib.compress(self.feature_counts.tobytes()),
+            "examples": self.examples,
+            "last_expense_id": self.last_expense_id,
+            "updated_at": datetime.utcnow(),
+        }
+
+    @classmethod
+    def from_row(cls, row: models.UserClassifier) -> "NaiveBayesModel":
+        counts = np.frombuffer(zlib.decompress(row.feature_counts), dtype=np.float32)
+        return cls(
+            row.categories, row.class_counts,
+            counts.reshape(len(row.categories), N_FEATURES).copy(), row.last_expense_id or 0,
+        )
+
+
+class ModelCache:
+    """Bounded LRU of loaded models keyed by user, with per-entry expiry"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        """(found, model); a user without a stored model is cached as None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                return False, None
+            self._entries.move_to_end(user_id)
+            return True, entry[1]
+
+    def put(self, user_id: int, model: Optional[NaiveBayesModel]) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, model)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+model_cache = ModelCache(MODEL_CACHE_SIZE, MODEL_CACHE_TTL_SECONDS)
+
+
+def load_model(db: Session, user_id: int) -> Optional[NaiveBayesModel]:
+    found, model = model_cache.get(user_id)
+    if not found:
+        row = db.get(models.UserClassifier, user_id)
+        model = NaiveBayesModel.from_row(row) if row is not None else None
+        model_cache.put(user_id, model)
+    return model
+
+
+def predict(db: Session, user_id: int, note: Optional[str]) -> Optional[str]:
+    """The user's model's category for a note, if it is confident enough to use"""
+    model = load_model(db, user_id)
+    if model is None or model.examples < MIN_EXAMPLES:
+        return None
+    prediction = model.predict(note)
+    if prediction is None or prediction[1] < MIN_CONFIDENCE:
+        return None
+    return prediction[0]
+
+
+def train_user(db: Session, user_id: int, rebuild: bool = False) -> int:
+    """Learn from the user's expenses added since the last run; returns examples added"""
+    row = db.get(models.UserClassifier, user_id)
+    model = NaiveBayesModel.from_row(row) if row is not None and not rebuild else NaiveBayesModel()
+    seen_until = model.last_expense_id
+    added = 0
+    while True:
+        chunk = db.execute(
+            select(models.Expense.id, models.Expense.note, models.Expense.category)
+            .where(
+                models.Expense.user_id == user_id,
+                models.Expense.id > model.last_expense_id,
+                models.Expense.note.isnot(None),
+                models.Expense.category.isnot(None),
+            )
+            .order_by(models.Expense.id)
+            .limit(TRAIN_CHUNK_SIZE)
+        ).all()
+        if not chunk:
+            break
+        added += model.learn((expense.note, expense.category) for expense in chunk)
+        model.last_expense_id = chunk[-1].id
+
+    # Saved even when nothing was learned, so the same expenses aren't read again
+    if row is None or rebuild or model.last_expense_id != seen_until:
+        db.merge(models.UserClassifier(**model.to_row(user_id)))
+    model_cache.invalidate(user_id)
+    return added
+
+
+def users_to_train(db: Session) -> List[int]:
+    """Users with labelled expenses newer than their stored model"""
+    return list(db.scalars(
+        select(models.Expense.user_id)
+        .outerjoin(models.UserClassifier, models.UserClassifier.user_id == models.Expense.user_id)
+        .where(
+            models.Expense.id > func.coalesce(models.UserClassifier.last_expense_id, 0),
+            models.Expense.note.isnot(None),
+            models.Expense.category.isnot(None),
+        )
+        .distinct()
+    ))
+
+
+def train_classifiers(user_id: Optional[int] = None, rebuild: bool = False) -> int:
+    """Train every user's model that is behind, committing per user"""
+    db = SessionLocal()
+    try:
+        if user_id is not None:
+            user_ids = [user_id]
+        elif rebuild:
+            user_ids = list(db.scalars(select(models.Expense.user_id).distinct()))
+        else:
+            user_ids = users_to_train(db)
+        added = 0
+        for user_id in user_ids:
+            added += train_user(db, user_id, rebuild=rebuild)
+            db.commit()
+        return added
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train the per-user expense categorizers")
+    parser.add_argument("command", choices=["train", "rebuild"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    added = train_classifiers(args.user_id, rebuild=args.command == "rebuild")
+    print(f"Learned from {added} expense(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
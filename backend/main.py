@@ -1,10 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Response, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import func
 from datetime import datetime, timedelta, date
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uvicorn
 from sqlalchemy import func
 from dotenv import load_dotenv
@@ -13,10 +15,23 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
+import database
 from database import get_db, engine
 import models
 import schemas
-from auth import create_access_token, get_current_user, get_password_hash, verify_password
+import metrics
+import auth
+import budget_events
+import budget_tracking
+import ai_service
+import analytics
+import categorizer
+import expense_queries
+import expense_io
+import insights
+import receipts
+import utils
+from auth import create_access_token, get_current_user, get_password_hash_pooled, verify_password_pooled
 from scheduler import setup_scheduler
 
 # Create database tables
@@ -31,9 +46,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Setup scheduler for recurring transactions
+# Per-route latency and SQL statement counts, served at /metrics
+metrics.instrument_engine(engine)
+if database.async_engine is not None:
+    metrics.instrument_engine(database.async_engine.sync_engine)
+app.middleware("http")(metrics.track_request)
+
+# Async versions of the expense and analytics routes, under /async
+if database.ASYNC_DATABASE_ENABLED:
+    import async_routes
+    app.include_router(async_routes.router)
+
+
+# Setup scheduler for recurring transactions; see SCHEDULER_MODE in scheduler.py
 setup_scheduler()
 
 # Authentication
@@ -41,9 +69,10 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # Sync so the user lookup runs in the threadpool rather than on the event loop
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not verify_password_pooled(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -51,7 +80,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -61,7 +90,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = get_password_hash_pooled(user.password)
     db_user = models.User(name=user.name, email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -78,21 +107,88 @@ def read_users_me(current_user: models.User = Depends(get_current_user)):
 @app.post("/expenses/", response_model=schemas.Expense)
 def create_expense(expense: schemas.ExpenseCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     db_expense = models.Expense(
-        **expense.dict(),
+        # A missing date falls back to the column default (now)
+        **expense.dict(exclude_none=True),
         user_id=current_user.id
     )
     db.add(db_expense)
+    db.flush()
+    budget_tracking.apply_expense_deltas(db, current_user.id, [(db_expense.category, db_expense.date, db_expense.amount)])
     db.commit()
+    budget_events.publish(current_user.id, [db_expense.category])
     db.refresh(db_expense)
     return db_expense
 
 
 @app.get("/expenses/", response_model=List[schemas.Expense])
-def read_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    expenses = db.query(models.Expense).filter(models.Expense.user_id == current_user.id).offset(skip).limit(limit).all()
+def read_expenses(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=expense_queries.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    wallet_id: Optional[int] = None,
+    person: Optional[str] = None,
+    person_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Newest first; pass the X-Next-Cursor header back as `cursor` for the next page
+    filters = expense_queries.expense_filters(current_user.id, start, end, category, wallet_id, person, person_id, tag)
+    try:
+        query = expense_queries.expense_page_query(filters, cursor, limit, skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    expenses, next_cursor = expense_queries.split_page(db.scalars(query).all(), limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return expenses
 
 
+@app.post("/expenses/import", response_model=schemas.ExpenseImportResult)
+def import_expenses(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    chunk_size: int = Query(expense_io.DEFAULT_CHUNK_SIZE, ge=1, le=expense_io.MAX_CHUNK_SIZE),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    # CSV needs a header row naming the ExpenseCreate fields; tags are separated by "|"
+    file_format = format or expense_io.detect_format(file.filename, file.content_type)
+    if file_format == "ndjson":
+        rows = expense_io.iter_ndjson_rows(file.file)
+    else:
+        rows = expense_io.iter_csv_rows(file.file)
+    try:
+        return expense_io.import_expenses(db, current_user.id, rows, chunk_size)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+
+
+@app.get("/expenses/export")
+def export_expenses(
+    format: Literal["csv", "ndjson"] = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    wallet_id: Optional[int] = None,
+    person: Optional[str] = None,
+    person_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user),
+):
+    # Streams the user's full history in (date, id) order with the listing filters applied
+    filters = expense_queries.expense_filters(current_user.id, start, end, category, wallet_id, person, person_id, tag)
+    return StreamingResponse(
+        expense_io.iter_export(filters, format),
+        media_type=expense_io.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'},
+    )
+
+
 @app.get("/expenses/{expense_id}", response_model=schemas.Expense)
 def read_expense(expense_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     expense = db.query(models.Expense).filter(models.Expense.id == expense_id, models.Expense.user_id == current_user.id).first()
@@ -107,11 +203,20 @@ def update_expense(expense_id: int, expense: schemas.ExpenseUpdate, db: Session
     if db_expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    previous = (db_expense.category, db_expense.date, db_expense.amount)
     update_data = expense.dict(exclude_unset=True)
+    if "date" in update_data and update_data["date"] is None:
+        # Expenses always have a date; null leaves it unchanged
+        del update_data["date"]
     for key, value in update_data.items():
         setattr(db_expense, key, value)
     
+    budget_tracking.apply_expense_deltas(db, current_user.id, [
+        (previous[0], previous[1], -(previous[2] or 0.0)),
+        (db_expense.category, db_expense.date, db_expense.amount),
+    ])
     db.commit()
+    budget_events.publish(current_user.id, [previous[0], db_expense.category])
     db.refresh(db_expense)
     return db_expense
 
@@ -122,10 +227,50 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db), current_user:
     if expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     db.delete(expense)
+    budget_tracking.apply_expense_deltas(db, current_user.id, [(expense.category, expense.date, -(expense.amount or 0.0))])
     db.commit()
+    budget_events.publish(current_user.id, [expense.category])
     return expense
 
 
+# Receipt routes
+@app.post("/receipts/", response_model=schemas.ReceiptJob, status_code=status.HTTP_202_ACCEPTED)
+async def upload_receipt(
+    file: UploadFile = File(...),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # OCR runs in the receipt workers (`python receipts.py work`); poll GET /receipts/{job_id} for the result
+    try:
+        file_path = await utils.save_upload_file(file)
+    except utils.UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    try:
+        job = await run_in_threadpool(receipts.queue_job, db, current_user.id, file_path)
+    except receipts.QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    return await run_in_threadpool(receipts.job_to_dict, job)
+
+
+@app.get("/receipts/{job_id}", response_model=schemas.ReceiptJob)
+def read_receipt_job(job_id: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    job = receipts.get_job(db, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Receipt job not found")
+    return receipts.job_to_dict(job)
+
+
+# Database pool monitoring
+@app.get("/db/pool-stats", dependencies=[Depends(auth.require_metrics_token)])
+def get_pool_stats():
+    return database.pool_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(auth.require_metrics_token)])
+def get_metrics():
+    return metrics.render(database.pool_stats(), auth.password_pool.stats())
+
+
 # Wallet routes
 @app.post("/wallets/", response_model=schemas.Wallet)
 def create_wallet(wallet: schemas.WalletCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
@@ -154,7 +299,10 @@ def create_budget(budget: schemas.BudgetCreate, db: Session = Depends(get_db), c
         user_id=current_user.id
     )
     db.add(db_budget)
+    budget_tracking.refresh_budget(db, db_budget)
     db.commit()
+    # The new budget may already be over its threshold
+    budget_events.publish(current_user.id, [db_budget.category])
     db.refresh(db_budget)
     return db_budget
 
@@ -162,23 +310,9 @@ def create_budget(budget: schemas.BudgetCreate, db: Session = Depends(get_db), c
 @app.get("/budgets/", response_model=List[schemas.Budget])
 def read_budgets(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     budgets = db.query(models.Budget).filter(models.Budget.user_id == current_user.id).all()
-    
-    # Calculate current amount for each budget
-    for budget in budgets:
-        # Get the start of the current month
-        today = datetime.now()
-        start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(microseconds=1)
-        
-        # Calculate total spent in this category for the current month
-        total_spent = db.query(func.sum(models.Expense.amount)).\
-            filter(models.Expense.user_id == current_user.id,\
-                models.Expense.category == budget.category,\
-                models.Expense.date >= start_of_month,\
-                models.Expense.date <= end_of_month).scalar() or 0.0
-        
-        budget.current_amount = total_spent
-    
+    # current_amount is maintained by the expense write paths; only budgets
+    # still holding last month's total need recomputing here
+    budget_tracking.ensure_current_period(db, budgets)
     return budgets
 
 
@@ -187,20 +321,7 @@ def read_budget(budget_id: int, db: Session = Depends(get_db), current_user: mod
     budget = db.query(models.Budget).filter(models.Budget.id == budget_id, models.Budget.user_id == current_user.id).first()
     if budget is None:
         raise HTTPException(status_code=404, detail="Budget not found")
-    
-    # Calculate current amount
-    today = datetime.now()
-    start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(microseconds=1)
-    
-    total_spent = db.query(func.sum(models.Expense.amount)).\
-        filter(models.Expense.user_id == current_user.id,\
-            models.Expense.category == budget.category,\
-            models.Expense.date >= start_of_month,\
-            models.Expense.date <= end_of_month).scalar() or 0.0
-    
-    budget.current_amount = total_spent
-    
+    budget_tracking.ensure_current_period(db, [budget])
     return budget
 
 
@@ -215,7 +336,11 @@ def update_budget(budget_id: int, budget: schemas.BudgetCreate, db: Session = De
     for key, value in update_data.items():
         setattr(db_budget, key, value)
     
+    # The category may have changed, and current_amount is not client-writable
+    budget_tracking.refresh_budget(db, db_budget)
     db.commit()
+    # A lower limit or threshold can put the budget over it
+    budget_events.publish(current_user.id, [db_budget.category])
     db.refresh(db_budget)
     return db_budget
 
@@ -306,255 +431,126 @@ def get_category_analytics(db: Session = Depends(get_db), current_user: models.U
 
 @app.get("/analytics/summary")
 def get_summary_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # Get current month's start and end dates
-    today = datetime.now()
-    start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(microseconds=1)
-
-    # Total spent this month
-    total_spent_this_month = db.query(func.sum(models.Expense.amount)).\
-        filter(models.Expense.user_id == current_user.id,\
-               models.Expense.date >= start_of_month,\
-               models.Expense.date <= end_of_month).scalar() or 0.0
-
-    # Top category this month
-    top_category_query = db.query(models.Expense.category, func.sum(models.Expense.amount).label('total_amount')).\
-        filter(models.Expense.user_id == current_user.id,\
-               models.Expense.date >= start_of_month,\
-               models.Expense.date <= end_of_month).\
-        group_by(models.Expense.category).\
-        order_by(func.sum(models.Expense.amount).desc()).first()
-    top_category = top_category_query.category if top_category_query else "N/A"
-
-    # Top person this month (using person_id relationship)
-    try:
-        # First try to get top person using the relationship
-        top_person_query = db.query(models.Person.name, func.sum(models.Expense.amount).label('total_amount')).\
-            join(models.Expense, models.Expense.person_id == models.Person.id).\
-            filter(models.Expense.user_id == current_user.id,\
-                models.Expense.date >= start_of_month,\
-                models.Expense.date <= end_of_month,\
-                models.Expense.person_id != None).\
-            group_by(models.Person.name).\
-            order_by(func.sum(models.Expense.amount).desc()).first()
-        
-        # If no results with relationship, try using the string field
-        if not top_person_query:
-            # Fallback to using the string person field
-            person_string_query = db.query(models.Expense.person, func.sum(models.Expense.amount).label('total_amount')).\
-                filter(models.Expense.user_id == current_user.id,\
-                    models.Expense.date >= start_of_month,\
-                    models.Expense.date <= end_of_month,\
-                    models.Expense.person != None).\
-                group_by(models.Expense.person).\
-                order_by(func.sum(models.Expense.amount).desc()).first()
-            top_person = person_string_query.person if person_string_query else "You"
-        else:
-            top_person = top_person_query.name
-    except Exception as e:
-        # If any error occurs, just use a default value
-        top_person = "You"
-
-    # Weekly spending (last 7 days)
-    start_of_week = today - timedelta(days=7)
-    weekly_total = db.query(func.sum(models.Expense.amount)).\
-        filter(models.Expense.user_id == current_user.id,\
-               models.Expense.date >= start_of_week,\
-               models.Expense.date <= today).scalar() or 0.0
-
-    # Previous month's spending
-    prev_month_start = (start_of_month - timedelta(days=1)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    prev_month_end = start_of_month - timedelta(microseconds=1)
-    
-    total_spent_prev_month = db.query(func.sum(models.Expense.amount)).\
-        filter(models.Expense.user_id == current_user.id,\
-               models.Expense.date >= prev_month_start,\
-               models.Expense.date <= prev_month_end).scalar() or 0.0
-    
-    # Calculate monthly change
-    monthly_change = 0
-    if total_spent_prev_month > 0:
-        monthly_change = ((total_spent_this_month - total_spent_prev_month) / total_spent_prev_month) * 100
-    
-    # Calculate savings rate (assuming income is stored or can be calculated)
-    # For now, we'll use a placeholder or estimate
-    # In a real app, you would get this from income data
-    estimated_income = 5000  # Placeholder
-    savings_rate = 0
-    if estimated_income > 0:
-        savings_rate = ((estimated_income - total_spent_this_month) / estimated_income) * 100
-    
-    return {
-        "total": total_spent_this_month,
-        "topCategory": top_category,
-        "topPerson": top_person,
-        "weeklyTotal": weekly_total,
-        "monthlyChange": monthly_change,
-        "savingsRate": savings_rate
-    }
+    # Month, week and previous-month totals plus the top category and person
+    # are computed by a single statement; see analytics.summary_query
+    return analytics.get_summary(db, current_user.id)
 
 @app.get("/analytics/category-breakdown")
-def get_category_breakdown_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user), time_range: str = "month"):
-    today = datetime.now()
-    if time_range == "week":
-        start_date = today - timedelta(days=7)
-    elif time_range == "month":
-        start_date = today.replace(day=1)
-    elif time_range == "year":
-        start_date = today.replace(month=1, day=1)
-    else:
-        start_date = today.replace(day=1)
-
-    expenses = db.query(models.Expense).filter(models.Expense.user_id == current_user.id, models.Expense.date >= start_date).all()
-    category_data = {}
-    total_amount = 0
-    for expense in expenses:
-        if expense.category in category_data:
-            category_data[expense.category] += expense.amount
-        else:
-            category_data[expense.category] = expense.amount
-        total_amount += expense.amount
-
-    breakdown = []
-    for category, amount in category_data.items():
-        percentage = (amount / total_amount) * 100 if total_amount > 0 else 0
-        breakdown.append({
-            "category": category,
-            "amount": amount,
-            "percentage": percentage
-        })
-    return breakdown
+def get_category_breakdown_analytics(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    time_range: str = "month",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    return analytics.get_category_breakdown(db, current_user.id, time_range, start, end)
 
 
 @app.get("/analytics/daily")
-def get_daily_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # Get expenses grouped by date
-    expenses = db.query(models.Expense).filter(models.Expense.user_id == current_user.id).all()
-    daily_data = {}
-    for expense in expenses:
-        date_str = expense.date.strftime("%Y-%m-%d")
-        if date_str in daily_data:
-            daily_data[date_str] += expense.amount
-        else:
-            daily_data[date_str] = expense.amount
-    
-    return daily_data
+def get_daily_analytics(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(analytics.DEFAULT_ROW_LIMIT, ge=1, le=analytics.MAX_ROW_LIMIT),
+):
+    # Totals per day, capped to the most recent `limit` days
+    return analytics.get_daily_totals(db, current_user.id, start, end, limit)
 
 @app.get("/analytics/monthly-trends")
-def get_monthly_trends_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user), months: int = 6):
-    trends = []
-    for i in range(months):
-        date = datetime.now() - timedelta(days=30 * i)
-        start_of_month = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(microseconds=1)
-
-        total_spent = db.query(func.sum(models.Expense.amount)).\
-            filter(models.Expense.user_id == current_user.id,\
-                   models.Expense.date >= start_of_month,\
-                   models.Expense.date <= end_of_month).scalar() or 0.0
-        trends.append({
-            "month": date.strftime("%b %Y"),
-            "amount": total_spent
-        })
-    return list(reversed(trends))
+def get_monthly_trends_analytics(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    months: int = Query(6, ge=1, le=analytics.MAX_TREND_MONTHS),
+    split_by: Optional[Literal["category", "wallet"]] = None,
+):
+    # One GROUP BY month query; months without expenses are filled with zero
+    return analytics.get_monthly_trends(db, current_user.id, months, split_by)
 
 
 @app.get("/analytics/person")
-def get_person_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # Get expenses grouped by person
-    expenses = db.query(models.Expense).filter(models.Expense.user_id == current_user.id).all()
-    person_data = {}
-    for expense in expenses:
-        if expense.person in person_data:
-            person_data[expense.person] += expense.amount
-        else:
-            person_data[expense.person] = expense.amount
-    
-    return person_data
+def get_person_analytics(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(analytics.DEFAULT_ROW_LIMIT, ge=1, le=analytics.MAX_ROW_LIMIT),
+):
+    return analytics.get_person_totals(db, current_user.id, start, end, limit)
 
 @app.get("/analytics/wallet-distribution")
 def get_wallet_distribution_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user), time_range: str = "month"):
-    today = datetime.now()
-    if time_range == "week":
-        start_date = today - timedelta(days=7)
-    elif time_range == "month":
-        start_date = today.replace(day=1)
-    elif time_range == "year":
-        start_date = today.replace(month=1, day=1)
-    else:
-        start_date = today.replace(day=1)
-
-    expenses = db.query(models.Expense).filter(models.Expense.user_id == current_user.id, models.Expense.date >= start_date).all()
-    wallet_data = {}
-    total_amount = 0
-    for expense in expenses:
-        wallet_name = db.query(models.Wallet.name).filter(models.Wallet.id == expense.wallet_id).scalar()
-        if wallet_name in wallet_data:
-            wallet_data[wallet_name] += expense.amount
-        else:
-            wallet_data[wallet_name] = expense.amount
-        total_amount += expense.amount
-
-    distribution = []
-    for wallet_name, amount in wallet_data.items():
-        percentage = (amount / total_amount) * 100 if total_amount > 0 else 0
-        distribution.append({
-            "wallet_name": wallet_name,
-            "amount": amount,
-            "percentage": percentage
-        })
-    return distribution
+    # Wallet totals and percentages come straight from one joined aggregate
+    return analytics.get_wallet_distribution(db, current_user.id, time_range)
 
 
 # AI Suggestions
 @app.get("/ai/categorize")
 def categorize_expense(note: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # This would use OpenAI or BoltAI to categorize expenses based on the note
-    # For now, we'll use a simple rule-based approach
-    note = note.lower()
-    if "food" in note or "restaurant" in note or "meal" in note:
-        return {"category": "Food"}
-    elif "transport" in note or "uber" in note or "taxi" in note or "bus" in note:
-        return {"category": "Transport"}
-    elif "rent" in note or "house" in note:
-        return {"category": "Housing"}
-    else:
-        return {"category": "Miscellaneous"}
+    return {"category": categorizer.categorizer_for_user(db, current_user.id).categorize(note)}
+
+
+@app.post("/ai/categorize/bulk", response_model=schemas.CategorizeResult)
+def categorize_expenses_bulk(request: schemas.BulkCategorizeRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return {"categories": categorizer.categorizer_for_user(db, current_user.id).categorize_many(request.notes)}
+
+
+@app.get("/ai/category-rules", response_model=List[schemas.CategoryRule])
+def get_category_rules(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return db.query(models.CategoryRule).filter(models.CategoryRule.user_id == current_user.id).order_by(models.CategoryRule.keyword).all()
+
+
+@app.post("/ai/category-rules", response_model=schemas.CategoryRule)
+def create_category_rule(rule: schemas.CategoryRuleCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    keyword = rule.keyword.strip().lower()
+    existing = db.query(models.CategoryRule).filter(models.CategoryRule.user_id == current_user.id, models.CategoryRule.keyword == keyword).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="A rule for this keyword already exists")
+    db_rule = models.CategoryRule(user_id=current_user.id, keyword=keyword, category=rule.category.strip())
+    db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    categorizer.user_categorizers.invalidate(current_user.id)
+    return db_rule
+
+
+@app.delete("/ai/category-rules/{rule_id}", response_model=schemas.CategoryRule)
+def delete_category_rule(rule_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    rule = db.query(models.CategoryRule).filter(models.CategoryRule.id == rule_id, models.CategoryRule.user_id == current_user.id).first()
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Category rule not found")
+    db.delete(rule)
+    db.commit()
+    categorizer.user_categorizers.invalidate(current_user.id)
+    return rule
+
+
+@app.post("/ai/smart-categorize", response_model=schemas.CategorizeResult)
+def smart_categorize_expenses(request: schemas.CategorizeRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # The user's own classifier and notes seen before are answered locally;
+    # the rest go to the model in batches
+    return {"categories": ai_service.categorize_expenses(request.notes, db, current_user.id)}
 
 
 @app.get("/ai/budget-suggestions")
-def get_budget_suggestions(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # This would use AI to suggest budgets based on spending habits
-    # For now, we'll use a simple rule-based approach
-    expenses = db.query(models.Expense).filter(models.Expense.user_id == current_user.id).all()
-    category_data = {}
-    for expense in expenses:
-        if expense.category in category_data:
-            category_data[expense.category] += expense.amount
-        else:
-            category_data[expense.category] = expense.amount
-    
-    suggestions = {}
-    for category, amount in category_data.items():
-        # Suggest a budget 20% higher than current spending
-        suggestions[category] = amount * 1.2
-    
-    return suggestions
+def get_budget_suggestions(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(analytics.DEFAULT_ROW_LIMIT, ge=1, le=analytics.MAX_ROW_LIMIT),
+):
+    if start is not None or end is not None:
+        return analytics.get_budget_suggestions(db, current_user.id, start, end, limit)
+    # All-time suggestions are precomputed by the insights jobs
+    suggestions = insights.get_insights(db, current_user.id).budget_suggestions
+    return dict(list(suggestions.items())[:limit])
 
 
 @app.get("/ai/savings-tips")
 def get_savings_tips(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    # This would use AI to suggest ways to save money
-    # For now, we'll return some generic tips
-    return {
-        "tips": [
-            "Consider making coffee at home instead of buying it",
-            "Look for sales and discounts when shopping",
-            "Use public transportation instead of taxis when possible",
-            "Cook meals at home instead of eating out",
-            "Cancel unused subscriptions"
-        ]
-    }
+    insight = insights.get_insights(db, current_user.id)
+    return {"tips": insight.savings_tips, "computed_at": insight.computed_at, "stale": insight.stale}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+"""Per-request latency and SQL accounting, exposed in Prometheus text format.
+
+An HTTP middleware times each request and attaches a RequestSQLStats object to
+the request's context; SQLAlchemy cursor hooks add every statement's count and
+duration to it.  Results are aggregated per route template (e.g.
+/expenses/{expense_id}) and rendered by `render` for the /metrics endpoint.
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Requests issuing more SQL statements than this are logged as warnings; 0 disables
+QUERY_WARN_THRESHOLD = int(os.getenv("METRICS_QUERY_WARN_THRESHOLD", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: LabelValues, value: float) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [per-bucket counts, sum, count]
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _labels(self.label_names, label_values, f'le="{_format_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return "\n".join(lines)
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: LabelValues = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, label_values)} {_format_number(value)}")
+        return "\n".join(lines)
+
+
+def _render_gauges(name: str, documentation: str, label_name: str, values: Dict[str, float]) -> str:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for label_value, value in sorted(values.items()):
+        lines.append(f"{name}{_labels((label_name,), (label_value,))} {_format_number(value)}")
+    return "\n".join(lines)
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "http_request_sql_queries", "SQL statements executed per HTTP request",
+    ("method", "route"), QUERY_COUNT_BUCKETS,
+)
+request_sql_duration = Histogram(
+    "http_request_sql_duration_seconds", "Total SQL execution time per HTTP request",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+sql_queries_total = Counter("sql_queries_total", "SQL statements executed, including background jobs")
+sql_duration_total = Counter("sql_duration_seconds_total", "Time spent executing SQL, including background jobs")
+
+
+class RequestSQLStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_sql_stats: ContextVar[Optional[RequestSQLStats]] = ContextVar("request_sql_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, which is simply dropped when
+    # the statement fails; context is None only for the dialect's own setup queries
+    if context is not None:
+        context._metrics_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    sql_queries_total.inc()
+    sql_duration_total.inc(amount=elapsed)
+    stats = _request_sql_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def instrument_engine(engine) -> None:
+    """Attach the query counting hooks to an Engine (or an AsyncEngine's sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+async def track_request(request: Request, call_next):
+    """HTTP middleware recording latency and SQL usage per route"""
+    stats = RequestSQLStats()
+    token = _request_sql_stats.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        _request_sql_stats.reset(token)
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        method = request.method
+        request_duration.observe((method, route_path, str(status)), elapsed)
+        request_queries.observe((method, route_path), stats.queries)
+        request_sql_duration.observe((method, route_path), stats.seconds)
+        if QUERY_WARN_THRESHOLD and stats.queries > QUERY_WARN_THRESHOLD:
+            logger.warning(
+                "%s %s ran %d SQL statements (threshold %d) taking %.1f ms",
+                method, route_path, stats.queries, QUERY_WARN_THRESHOLD, stats.seconds * 1000,
+            )
+
+
+def render(pool_stats: Dict[str, dict], password_pool_stats: dict) -> str:
+    """Render every metric in Prometheus text exposition format"""
+    sections = [
+        request_duration.render(),
+        request_queries.render(),
+        request_sql_duration.render(),
+        sql_queries_total.render(),
+        sql_duration_total.render(),
+    ]
+    for field, documentation in [
+        ("checked_out", "Connections currently checked out"),
+        ("overflow", "Overflow connections currently open"),
+        ("checkouts", "Connections checked out since start"),
+        ("waits", "Checkouts that waited for a free connection"),
+        ("wait_seconds_total", "Time spent waiting for a free connection"),
+        ("timeouts", "Checkouts that timed out"),
+    ]:
+        values = {engine_name: stats[field] for engine_name, stats in pool_stats.items()}
+        sections.append(_render_gauges(f"db_pool_{field}", documentation, "engine", values))
+    sections.append(_render_gauges(
+        "password_hash_pool", "bcrypt pool workers and queue depth", "state", password_pool_stats,
+    ))
+    return "\n".join(sections) + "\n"
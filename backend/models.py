@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Table, ARRAY
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Table, ARRAY, Index, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime, timedelta
@@ -45,13 +45,13 @@ class Expense(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     amount = Column(Float)
     category = Column(String, index=True)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, default=datetime.utcnow, nullable=False)
     note = Column(String, nullable=True)
     person = Column(String, nullable=True)  # Legacy field - keeping for backward compatibility
     person_id = Column(Integer, ForeignKey("people.id"), nullable=True)
     wallet_id = Column(Integer, ForeignKey("wallets.id"), nullable=True)
     is_recurring = Column(Boolean, default=False)
-    tags = Column(ARRAY(String), nullable=True)
+    tags = Column(ARRAY(String).with_variant(JSON(), "sqlite"), nullable=True)  # JSON on SQLite for local benchmarks
     image_url = Column(String, nullable=True)
 
     # Relationships
@@ -60,6 +60,17 @@ class Expense(Base):
     person_rel = relationship("Person", back_populates="expenses")
     recurring = relationship("RecurringExpense", back_populates="expense", uselist=False)
 
+    __table_args__ = (
+        # Covers per-user date range scans grouped by wallet; amount is included
+        # so wallet analytics can be answered from the index alone
+        Index("ix_expenses_user_date_wallet", "user_id", "date", "wallet_id", postgresql_include=["amount"]),
+        # Keyset pagination of GET /expenses/, unfiltered and by category or wallet
+        Index("ix_expenses_user_date_id", "user_id", "date", "id"),
+        Index("ix_expenses_user_category_date_id", "user_id", "category", "date", "id"),
+        Index("ix_expenses_user_wallet_date_id", "user_id", "wallet_id", "date", "id"),
+        Index("ix_expenses_tags", "tags", postgresql_using="gin"),
+    )
+
 
 class Wallet(Base):
     __tablename__ = "wallets"
@@ -99,6 +110,7 @@ class Budget(Base):
     category = Column(String, index=True)
     monthly_limit = Column(Float)
     current_amount = Column(Float, default=0.0)
+    current_period_start = Column(DateTime, nullable=True)  # Month that current_amount belongs to
     start_date = Column(DateTime, default=datetime.utcnow)
     end_date = Column(DateTime, default=lambda: datetime.utcnow() + timedelta(days=30))
     alert_threshold = Column(Float, default=80.0)
@@ -161,4 +173,74 @@ class UserSetting(Base):
     budget_alerts = Column(Boolean, default=True)
     goal_updates = Column(Boolean, default=True)
 
-    user = relationship("User", back_populates="settings")
\ No newline at end of file
+    user = relationship("User", back_populates="settings")
+
+class CategorizationCache(Base):
+    """Categories the AI model gave for normalized expense notes"""
+    __tablename__ = "categorization_cache"
+
+    note_key = Column(String, primary_key=True)
+    category = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CategoryRule(Base):
+    """A user's keyword -> category override for rule-based categorization"""
+    __tablename__ = "category_rules"
+    __table_args__ = (
+        UniqueConstraint("user_id", "keyword", name="uq_category_rules_user_keyword"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    keyword = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserClassifier(Base):
+    """A user's naive Bayes categorizer, see local_classifier.py"""
+    __tablename__ = "user_classifiers"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    categories = Column(JSON, nullable=False)
+    class_counts = Column(JSON, nullable=False)
+    # zlib-compressed float32 array of shape (len(categories), N_FEATURES)
+    feature_counts = Column(LargeBinary, nullable=False)
+    examples = Column(Integer, default=0)
+    # Newest expense learned from; training resumes after it
+    last_expense_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserInsight(Base):
+    """Precomputed budget suggestions and savings tips, see insights.py"""
+    __tablename__ = "user_insights"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # Category -> suggested amount, highest first
+    budget_suggestions = Column(JSON, nullable=False)
+    savings_tips = Column(JSON, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+    # Set when the user's expenses change; cleared by the next refresh
+    stale = Column(Boolean, default=False, nullable=False)
+
+
+class ReceiptJob(Base):
+    """A receipt image waiting for or done with OCR, see receipts.py"""
+    __tablename__ = "receipt_jobs"
+    __table_args__ = (
+        Index("ix_receipt_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    image_url = Column(String, nullable=False)
+    status = Column(String, default="pending", nullable=False)  # pending, processing, done, failed
+    # utils.parse_receipt_text output once done
+    result = Column(JSON)
+    error = Column(String)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime)
+    finished_at = Column(DateTime)
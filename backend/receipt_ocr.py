@@ -0,0 +1,77 @@
+"""Receipt OCR, run in the receipt worker's pool processes (see receipts.py).
+
+Before OCR each image is downscaled, converted to grayscale and deskewed,
+which makes tesseract both faster and more accurate on phone photos.  This
+module is what the pool processes import, so it stays clear of the app and
+the database.
+"""
+import os
+
+from PIL import Image, ImageOps
+
+# Longest image side after downscaling; phone photos are often 4000px+
+MAX_IMAGE_DIMENSION = int(os.getenv("RECEIPT_MAX_IMAGE_DIMENSION", "2000"))
+
+# Skew search: coarse steps over +/-MAX_SKEW_DEGREES, then a finer pass
+MAX_SKEW_DEGREES = 10.0
+SKEW_COARSE_STEP = 1.0
+SKEW_FINE_STEP = 0.2
+# Width of the thumbnail the skew is measured on
+SKEW_SAMPLE_WIDTH = 600
+
+
+def _row_profile_score(ink: Image.Image, angle: float) -> float:
+    """Variance of per-row ink after rotating by angle.
+
+    Text lines that are level produce alternating full and empty rows, which
+    maximises the variance of the horizontal projection.
+    """
+    rotated = ink.rotate(angle, resample=Image.BILINEAR, expand=False, fillcolor=0)
+    # Shrinking to one column with a box filter averages each row
+    profile = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+    mean = sum(profile) / len(profile)
+    return sum((value - mean) ** 2 for value in profile)
+
+
+def estimate_skew(gray: Image.Image) -> float:
+    """Return the rotation in degrees that levels the text lines of a grayscale image"""
+    sample = gray.copy()
+    sample.thumbnail((SKEW_SAMPLE_WIDTH, SKEW_SAMPLE_WIDTH * 4))
+    # Dark text becomes bright "ink" on a black background
+    ink = ImageOps.autocontrast(ImageOps.invert(sample)).point(lambda value: 255 if value > 128 else 0)
+
+    def best(candidates):
+        return max(candidates, key=lambda angle: _row_profile_score(ink, angle))
+
+    steps = int(MAX_SKEW_DEGREES / SKEW_COARSE_STEP)
+    coarse = best([i * SKEW_COARSE_STEP for i in range(-steps, steps + 1)])
+    fine_steps = int(SKEW_COARSE_STEP / SKEW_FINE_STEP)
+    return best([coarse + i * SKEW_FINE_STEP for i in range(-fine_steps, fine_steps + 1)])
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """Downscale, grayscale and deskew a receipt photo for OCR"""
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.LANCZOS)
+    angle = estimate_skew(image)
+    if abs(angle) >= SKEW_FINE_STEP:
+        image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return image
+
+
+def ocr_receipt(file_path: str) -> dict:
+    """Worker process entry point: OCR one receipt image and parse it"""
+    import pytesseract
+
+    from utils import parse_receipt_text
+
+    try:
+        with Image.open(file_path) as image:
+            prepared = preprocess_image(image)
+        text = pytesseract.image_to_string(prepared)
+    except Exception as e:
+        # Some library exceptions can't be unpickled in the parent, which
+        # would break the whole pool; send back a plain one instead
+        raise RuntimeError(f"{e.__class__.__name__}: {e}") from None
+    return parse_receipt_text(text)
@@ -0,0 +1,270 @@
+"""Receipt OCR jobs, queued in the receipt_jobs table and run by OCR workers.
+
+POST /receipts/ saves the image and inserts a pending job; GET
+/receipts/{job_id} reads the row, so any API process can answer for any job
+and queued jobs survive restarts.  OCR (tesseract, see receipt_ocr.py) runs in
+`python receipts.py work`, which claims pending jobs and hands them to a pool
+of worker processes, so it neither holds an API process's GIL nor ties up a
+request thread for the seconds it takes.  Several workers can run side by
+side: jobs are claimed with SKIP LOCKED, and a job whose worker died is
+claimed again after RECEIPT_JOB_TIMEOUT_SECONDS.
+
+The pool processes are spawned from the worker, not from the API, so what
+they re-import as their __main__ is this module and never the app.
+
+Finished jobs are deleted RECEIPT_JOB_TTL_SECONDS after they finish.
+
+Usage:
+    python receipts.py work [--workers N]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from receipt_ocr import ocr_receipt
+
+logger = logging.getLogger(__name__)
+
+# OCR pool processes per worker; each tesseract run is single-threaded
+OCR_WORKERS = int(os.getenv("RECEIPT_OCR_WORKERS", "2"))
+
+# Jobs pending or processing, across all workers, before uploads are refused with 503
+MAX_PENDING_JOBS = int(os.getenv("RECEIPT_MAX_PENDING_JOBS", "100"))
+
+JOB_TTL_SECONDS = int(os.getenv("RECEIPT_JOB_TTL_SECONDS", "3600"))
+
+# A job still processing after this long is assumed lost with its worker and
+# claimed again, up to MAX_ATTEMPTS times in all
+JOB_TIMEOUT_SECONDS = int(os.getenv("RECEIPT_JOB_TIMEOUT_SECONDS", "600"))
+MAX_ATTEMPTS = 3
+
+# How often an idle worker looks for new jobs
+POLL_SECONDS = float(os.getenv("RECEIPT_POLL_SECONDS", "1"))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when MAX_PENDING_JOBS receipts are already waiting for OCR"""
+
+
+def job_to_dict(job: models.ReceiptJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "image_url": job.image_url,
+        "result": job.result if job.status == "done" else None,
+        "error": job.error if job.status == "failed" else None,
+    }
+
+
+def queue_job(db: Session, user_id: int, image_url: str) -> models.ReceiptJob:
+    """Insert a pending job for an uploaded image and commit it"""
+    pending = db.scalar(
+        select(func.count()).select_from(models.ReceiptJob)
+        .where(models.ReceiptJob.status.in_(("pending", "processing")))
+    )
+    if pending >= MAX_PENDING_JOBS:
+        raise QueueFullError(f"{pending} receipts are already waiting for OCR")
+    job = models.ReceiptJob(id=uuid.uuid4().hex, user_id=user_id, image_url=image_url, status="pending")
+    db.add(job)
+    db.commit()
+    return job
+
+
+def get_job(db: Session, job_id: str, user_id: int) -> Optional[models.ReceiptJob]:
+    job = db.get(models.ReceiptJob, job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+
+def claim_jobs(db: Session, limit: int, now: Optional[datetime] = None) -> List[Tuple[str, str]]:
+    """Mark up to limit pending (or abandoned) jobs as processing and commit;
+    returns their (id, image_url).
+
+    Rows locked by another worker are skipped, so each job is claimed once.
+    """
+    now = now or datetime.utcnow()
+    jobs = db.scalars(
+        select(models.ReceiptJob)
+        .where(or_(
+            models.ReceiptJob.status == "pending",
+            (models.ReceiptJob.status == "processing")
+            & (models.ReceiptJob.claimed_at < now - timedelta(seconds=JOB_TIMEOUT_SECONDS)),
+        ))
+        .order_by(models.ReceiptJob.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    claimed = []
+    for job in jobs:
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = f"Gave up after {job.attempts} attempts"
+            job.finished_at = now
+            continue
+        job.status = "processing"
+        job.claimed_at = now
+        job.attempts += 1
+        claimed.append((job.id, job.image_url))
+    db.commit()
+    return claimed
+
+
+def finish_job(db: Session, job_id: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+    db.execute(
+        update(models.ReceiptJob)
+        .where(models.ReceiptJob.id == job_id)
+        .values(
+            status="failed" if error is not None else "done",
+            result=result, error=error, finished_at=datetime.utcnow(),
+        )
+    )
+    db.commit()
+
+
+def prune_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=JOB_TTL_SECONDS)
+    deleted = db.execute(
+        delete(models.ReceiptJob).where(
+            models.ReceiptJob.status.in_(("done", "failed")), models.ReceiptJob.finished_at < cutoff,
+        )
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+class ReceiptWorker:
+    """Claims jobs from receipt_jobs and runs them on an OCR process pool"""
+
+    def __init__(self, workers: int = OCR_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned rather than forked: the worker runs threads (the pool's
+            # manager, result callbacks) that a fork would copy mid-flight
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _submit(self, image_url: str) -> Future:
+        try:
+            return self._get_executor().submit(ocr_receipt, image_url)
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed for memory); start a fresh pool
+            logger.warning("Receipt OCR pool was broken; restarting it")
+            self._executor = None
+            return self._get_executor().submit(ocr_receipt, image_url)
+
+    def _finished(self, job_id: str, future: Future) -> None:
+        if future.cancelled():
+            # Cancelled by shutdown(), which puts the job back in the queue
+            return
+        error = future.exception()
+        if error is not None:
+            logger.warning("Receipt job %s failed: %s", job_id, error)
+        db = SessionLocal()
+        try:
+            finish_job(db, job_id, None if error is not None else future.result(),
+                       None if error is None else str(error))
+        except Exception:
+            # Left processing; claimed again after JOB_TIMEOUT_SECONDS
+            logger.exception("Saving receipt job %s failed", job_id)
+        finally:
+            db.close()
+            with self._lock:
+                self._running.pop(job_id, None)
+
+    def run_once(self) -> int:
+        """Claim as many jobs as there are idle pool processes; returns how many"""
+        with self._lock:
+            idle = self.workers - len(self._running)
+        if idle <= 0:
+            return 0
+        db = SessionLocal()
+        try:
+            jobs = claim_jobs(db, idle)
+        finally:
+            db.close()
+        for job_id, image_url in jobs:
+            future = self._submit(image_url)
+            with self._lock:
+                self._running[job_id] = future
+            future.add_done_callback(lambda future, job_id=job_id: self._finished(job_id, future))
+        return len(jobs)
+
+    def run(self, poll_seconds: float = POLL_SECONDS) -> None:
+        next_prune = 0.0
+        while True:
+            if time.monotonic() >= next_prune:
+                db = SessionLocal()
+                try:
+                    prune_jobs(db)
+                finally:
+                    db.close()
+                next_prune = time.monotonic() + 60
+            if not self.run_once():
+                time.sleep(poll_seconds)
+
+    def shutdown(self) -> None:
+        """Stop the pool and hand the jobs it was running back to the queue"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            job_ids = list(self._running)
+        if job_ids:
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(models.ReceiptJob)
+                    .where(models.ReceiptJob.id.in_(job_ids), models.ReceiptJob.status == "processing")
+                    .values(status="pending", attempts=models.ReceiptJob.attempts - 1)
+                )
+                db.commit()
+            finally:
+                db.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run receipt OCR jobs queued by the API")
+    parser.add_argument("command", choices=["work"])
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # Process managers stop workers with SIGTERM; exit through the finally
+    # below so the pool processes stop too and running jobs are requeued
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    worker = ReceiptWorker(args.workers)
+    logger.info("Receipt worker started with %d OCR processes", args.workers)
+    try:
+        worker.run()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        worker.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,109 +1,358 @@
+import argparse
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import create_engine, insert, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
 
-from database import SessionLocal
+from database import SessionLocal, engine
 import models
+import budget_events
+import budget_tracking
+import insights
+import local_classifier
+from utils import add_months
+
+logger = logging.getLogger(__name__)
+
+# Recurring expenses claimed, posted and committed per transaction
+RECURRING_CHUNK_SIZE = 500
+
+# Occurrences posted per schedule in one run; a schedule further behind than
+# this (e.g. a bogus next_due years in the past) catches up over later runs
+MAX_CATCH_UP_OCCURRENCES = 1000
+
+# "leader": every process schedules the jobs but only the holder of a
+# PostgreSQL advisory lock runs them; "embedded": every process runs them;
+# "off": API processes start no scheduler and `python scheduler.py` does
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "leader").lower()
+if SCHEDULER_MODE not in ("leader", "embedded", "off"):
+    raise ValueError(f"SCHEDULER_MODE must be leader, embedded or off, not {SCHEDULER_MODE!r}")
+
+# Advisory lock key shared by every process that may run the jobs
+SCHEDULER_LOCK_ID = int(os.getenv("SCHEDULER_LOCK_ID", "724001"))
+
+# Run the nightly scan over every budget in addition to event-driven alerts
+BUDGET_ALERT_FULL_SCAN = os.getenv("BUDGET_ALERT_FULL_SCAN", "").lower() in ("1", "true", "yes")
 
 # Create scheduler
 scheduler = BackgroundScheduler()
 
 
-def process_recurring_expenses():
-    """Process all recurring expenses that are due"""
+def next_occurrence(anchor: datetime, frequency: str, periods: int) -> Optional[datetime]:
+    """Return the date `periods` schedule steps after anchor, or None for an unknown frequency"""
+    if frequency == "daily":
+        return anchor + timedelta(days=periods)
+    if frequency == "weekly":
+        return anchor + timedelta(weeks=periods)
+    if frequency == "monthly":
+        return add_months(anchor, periods)
+    return None
+
+
+def _schedule_anchor(recurring: models.RecurringExpense, template: models.Expense) -> Tuple[datetime, int]:
+    """Return the date a schedule's steps are counted from and the steps from it to next_due.
+
+    Monthly schedules count from the template expense's day of month, so one
+    on the 31st goes Jan 31, Feb 28, Mar 31 rather than staying on the 28th
+    after February; stepping from the stored next_due would lose the day.
+    """
+    due = recurring.next_due
+    if recurring.frequency != "monthly" or template.date is None:
+        return due, 0
+    anchor = datetime.combine(template.date.date(), due.time())
+    return anchor, (due.year - anchor.year) * 12 + due.month - anchor.month
+
+
+def _due_occurrences(
+    recurring: models.RecurringExpense, template: models.Expense, now: datetime,
+) -> Tuple[List[datetime], Optional[datetime]]:
+    """Return every missed occurrence up to now and the next due date after them"""
+    occurrences = []
+    due = recurring.next_due
+    if due is None:
+        return occurrences, None
+    anchor, periods = _schedule_anchor(recurring, template)
+    while due is not None and due <= now and len(occurrences) < MAX_CATCH_UP_OCCURRENCES:
+        occurrences.append(due)
+        due = next_occurrence(anchor, recurring.frequency, periods + len(occurrences))
+    return occurrences, due
+
+
+def _claim_due_chunk(db: Session, now: datetime, after_id: int, chunk_size: int):
+    """Lock the next chunk of due schedules together with their template expenses.
+
+    Rows already locked by another worker are skipped rather than waited for,
+    so several processes can work through the backlog without posting the
+    same occurrence twice.
+    """
+    return db.execute(
+        select(models.RecurringExpense, models.Expense)
+        .join(models.Expense, models.RecurringExpense.expense_id == models.Expense.id)
+        .where(models.RecurringExpense.next_due <= now, models.RecurringExpense.id > after_id)
+        .order_by(models.RecurringExpense.id)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True, of=models.RecurringExpense)
+    ).all()
+
+
+def process_recurring_expenses(chunk_size: int = RECURRING_CHUNK_SIZE, now: Optional[datetime] = None) -> dict:
+    """Post every due occurrence of every recurring expense.
+
+    Due schedules are claimed in chunks.  Each chunk posts all of its missed
+    occurrences (dated when they fell due) with one bulk insert, advances
+    next_due past them and commits, so a crash only repeats the current chunk.
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    schedules = posted = 0
+    after_id = 0
     db = SessionLocal()
     try:
-        # Get all recurring expenses that are due
-        recurring_expenses = db.query(models.RecurringExpense).filter(
-            models.RecurringExpense.next_due <= datetime.utcnow()
-        ).all()
-        
-        for recurring in recurring_expenses:
-            # Get the original expense
-            original_expense = recurring.expense
-            
-            # Create a new expense based on the original
-            new_expense = models.Expense(
-                user_id=original_expense.user_id,
-                amount=original_expense.amount,
-                category=original_expense.category,
-                date=datetime.utcnow(),
-                note=original_expense.note,
-                person=original_expense.person,
-                wallet_id=original_expense.wallet_id,
-                is_recurring=False,  # This is a one-time expense created from a recurring one
-                tags=original_expense.tags
-            )
-            db.add(new_expense)
-            
-            # Update the next due date based on frequency
-            if recurring.frequency == "daily":
-                recurring.next_due = recurring.next_due + timedelta(days=1)
-            elif recurring.frequency == "weekly":
-                recurring.next_due = recurring.next_due + timedelta(weeks=1)
-            elif recurring.frequency == "monthly":
-                # Add one month (approximately)
-                next_month = recurring.next_due.month + 1
-                next_year = recurring.next_due.year
-                if next_month > 12:
-                    next_month = 1
-                    next_year += 1
-                recurring.next_due = recurring.next_due.replace(year=next_year, month=next_month)
-            
+        while True:
+            chunk = _claim_due_chunk(db, now, after_id, chunk_size)
+            if not chunk:
+                break
+            after_id = chunk[-1][0].id
+
+            new_expenses = []
+            next_due_updates = []
+            deltas: Dict[int, list] = defaultdict(list)
+            for recurring, template in chunk:
+                occurrences, next_due = _due_occurrences(recurring, template, now)
+                if next_due is None:
+                    logger.warning("Recurring expense %s has unknown frequency %r", recurring.id, recurring.frequency)
+                    continue
+                for due in occurrences:
+                    new_expenses.append({
+                        "user_id": template.user_id,
+                        "amount": template.amount,
+                        "category": template.category,
+                        "date": due,
+                        "note": template.note,
+                        "person": template.person,
+                        "person_id": template.person_id,
+                        "wallet_id": template.wallet_id,
+                        "is_recurring": False,  # This is a one-time expense created from a recurring one
+                        "tags": template.tags,
+                        "image_url": None,
+                    })
+                    deltas[template.user_id].append((template.category, due, template.amount))
+                next_due_updates.append({"id": recurring.id, "next_due": next_due})
+
+            if new_expenses:
+                db.execute(insert(models.Expense), new_expenses)
+            if next_due_updates:
+                db.execute(update(models.RecurringExpense), next_due_updates)
+            for user_id, changes in deltas.items():
+                budget_tracking.apply_expense_deltas(db, user_id, changes)
             db.commit()
+            for user_id, changes in deltas.items():
+                budget_events.publish(user_id, {category for category, _, _ in changes})
+
+            schedules += len(next_due_updates)
+            posted += len(new_expenses)
+            if len(chunk) < chunk_size:
+                break
     finally:
         db.close()
 
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Recurring expenses: %d schedules, %d expenses posted in %.2fs (%.0f expenses/s)",
+        schedules, posted, elapsed, posted / elapsed if elapsed else 0.0,
+    )
+    return {"schedules": schedules, "expenses_posted": posted, "seconds": elapsed}
+
 
 def check_budget_alerts():
-    """Check if any budgets have been exceeded and create alerts"""
+    """Create alerts for budgets that reached their alert threshold this month"""
     db = SessionLocal()
     try:
-        # Get all budgets
-        budgets = db.query(models.Budget).all()
-        
-        for budget in budgets:
-            # Get the current month's expenses for this category
-            now = datetime.utcnow()
-            start_of_month = datetime(now.year, now.month, 1)
-            end_of_month = datetime(now.year, now.month + 1, 1) if now.month < 12 else datetime(now.year + 1, 1, 1)
-            
-            total_spent = db.query(models.Expense).filter(
-                models.Expense.user_id == budget.user_id,
-                models.Expense.category == budget.category,
-                models.Expense.date >= start_of_month,
-                models.Expense.date < end_of_month
-            ).with_entities(models.Expense.amount).all()
-            
-            total_amount = sum(amount for (amount,) in total_spent)
-            
-            # Check if budget is exceeded
-            if total_amount > budget.monthly_limit:
-                # Check if an alert has already been created for this budget this month
-                existing_alert = db.query(models.Alert).filter(
-                    models.Alert.budget_id == budget.id,
-                    models.Alert.triggered_on >= start_of_month
-                ).first()
-                
-                if not existing_alert:
-                    # Create a new alert
-                    alert = models.Alert(
-                        user_id=budget.user_id,
-                        budget_id=budget.id,
-                        message=f"Budget for {budget.category} exceeded! Limit: {budget.monthly_limit}, Spent: {total_amount}"
-                    )
-                    db.add(alert)
-                    db.commit()
+        created = budget_tracking.evaluate_alerts(db)
+        db.commit()
+        logger.info("Budget alerts: %d created", created)
+        return created
     finally:
         db.close()
 
 
+def train_classifiers():
+    """Teach each user's local categorizer the expenses added since the last run"""
+    added = local_classifier.train_classifiers()
+    logger.info("Local classifiers: learned from %d expense(s)", added)
+    return added
+
+
+def refresh_insights():
+    """Recompute every user's budget suggestions and savings tips"""
+    refreshed = insights.refresh_insights()
+    logger.info("Insights: refreshed %d user(s)", refreshed)
+    return refreshed
+
+
+def refresh_stale_insights():
+    """Recompute insights for users whose expenses changed since the last run"""
+    refreshed = insights.refresh_insights(stale_only=True)
+    if refreshed:
+        logger.info("Insights: refreshed %d stale user(s)", refreshed)
+    return refreshed
+
+
+def reset_budget_periods():
+    """Start every budget's running total afresh for the new month"""
+    db = SessionLocal()
+    try:
+        budget_tracking.rebuild_budget_amounts(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+class LeaderElection:
+    """Cluster-wide leadership held as a PostgreSQL session advisory lock.
+
+    The lock lives on a dedicated connection outside the pool, so it is held
+    for as long as this process keeps that connection open and is released by
+    the server as soon as the process dies.  Other processes keep trying on
+    each job run and take over from there.  Databases without advisory locks
+    (SQLite) are single-host, so every process is treated as the leader.
+    """
+
+    def __init__(self, url, lock_id: int):
+        self.url = url
+        self.lock_id = lock_id
+        self._engine = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _release(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except SQLAlchemyError:
+                pass
+            self._connection = None
+
+    def is_leader(self) -> bool:
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(self.url, poolclass=NullPool, isolation_level="AUTOCOMMIT")
+            if self._engine.dialect.name != "postgresql":
+                return True
+            if self._connection is not None:
+                try:
+                    # The lock is only still ours if the session that holds it is alive
+                    self._connection.exec_driver_sql("SELECT 1")
+                    return True
+                except SQLAlchemyError:
+                    logger.warning("Lost the scheduler leader connection; re-electing")
+                    self._release()
+            try:
+                connection = self._engine.connect()
+                acquired = connection.scalar(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": self.lock_id})
+            except SQLAlchemyError:
+                logger.exception("Scheduler leader election failed")
+                return False
+            if acquired:
+                logger.info("This process is now the scheduler leader")
+                self._connection = connection
+                return True
+            connection.close()
+            return False
+
+    def resign(self) -> None:
+        with self._lock:
+            self._release()
+
+
+leader = LeaderElection(engine.url, SCHEDULER_LOCK_ID)
+
+
+def _leader_only(job):
+    """Wrap a job so it only runs in the process currently holding leadership"""
+    @functools.wraps(job)
+    def run():
+        if not leader.is_leader():
+            logger.debug("Skipping %s: not the scheduler leader", job.__name__)
+            return None
+        return job()
+    return run
+
+
+JOBS = {
+    "recurring": (process_recurring_expenses, CronTrigger(hour=0, minute=0)),  # Run daily at midnight
+    "alerts": (check_budget_alerts, CronTrigger(hour=0, minute=5)),  # Run daily at 00:05 with BUDGET_ALERT_FULL_SCAN
+    "budget-periods": (reset_budget_periods, CronTrigger(day=1, hour=0, minute=0)),  # Run monthly at midnight on the 1st
+    "classifiers": (train_classifiers, CronTrigger(minute=30)),  # Run hourly at half past
+    "insights": (refresh_insights, CronTrigger(hour=2, minute=0)),  # Run daily at 02:00
+    "insights-stale": (refresh_stale_insights, CronTrigger(minute="*/10")),  # Run every 10 minutes
+}
+
+
+def scheduled_jobs() -> List[str]:
+    # Alerts are raised by budget_events as expenses change; the nightly
+    # full scan is only a safety net for events lost with a killed process
+    return [name for name in JOBS if name != "alerts" or BUDGET_ALERT_FULL_SCAN]
+
+
+def add_jobs(target, elect_leader: bool) -> None:
+    for name in scheduled_jobs():
+        job, trigger = JOBS[name]
+        target.add_job(_leader_only(job) if elect_leader else job, trigger, id=name)
+
+
 def setup_scheduler():
-    """Set up the scheduler with jobs"""
-    # Add jobs to the scheduler
-    scheduler.add_job(process_recurring_expenses, CronTrigger(hour=0, minute=0))  # Run daily at midnight
-    scheduler.add_job(check_budget_alerts, CronTrigger(hour=0, minute=5))  # Run daily at 00:05
-    
+    """Set up the in-process scheduler according to SCHEDULER_MODE"""
+    if SCHEDULER_MODE == "off":
+        # Jobs run in a separate `python scheduler.py` worker
+        return
+    add_jobs(scheduler, elect_leader=SCHEDULER_MODE == "leader")
+
     # Start the scheduler
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the scheduled jobs outside the API processes")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("serve", help="run the jobs on their schedule (default)")
+    run_parser = subparsers.add_parser("run", help="run one job now and exit")
+    run_parser.add_argument("job", choices=sorted(JOBS))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.command == "run":
+        job, _ = JOBS[args.job]
+        result = job()
+        # Alert checks queued by the job run before the process exits
+        budget_events.queue.drain()
+        print(f"{args.job}: {result}")
+        return 0
+
+    # Several workers may be started for availability; only the leader runs jobs
+    worker = BlockingScheduler()
+    add_jobs(worker, elect_leader=True)
+    logger.info("Scheduler worker started with jobs: %s", ", ".join(scheduled_jobs()))
+    try:
+        worker.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        budget_events.queue.drain()
+        leader.resign()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
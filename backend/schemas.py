@@ -10,6 +10,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
 
 
 # User schemas
@@ -85,6 +86,42 @@ class Expense(ExpenseBase):
         orm_mode = True
 
 
+class ExpenseImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class ExpenseImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[ExpenseImportError]
+    errors_truncated: bool = False
+
+
+# Receipt schemas
+class ReceiptItem(BaseModel):
+    description: str
+    amount: float
+
+
+class ReceiptData(BaseModel):
+    amount: Optional[float] = None
+    date: Optional[str] = None
+    merchant: Optional[str] = None
+    subtotal: Optional[float] = None
+    tax: Optional[float] = None
+    currency: Optional[str] = None
+    items: List[ReceiptItem] = []
+
+
+class ReceiptJob(BaseModel):
+    job_id: str
+    status: str  # pending, processing, done, failed
+    image_url: Optional[str] = None
+    result: Optional[ReceiptData] = None
+    error: Optional[str] = None
+
+
 # Wallet schemas
 class WalletBase(BaseModel):
     name: str
@@ -221,3 +258,34 @@ class UserSetting(UserSettingBase):
 
     class Config:
         orm_mode = True
+
+
+# AI categorization schemas
+class CategorizeRequest(BaseModel):
+    notes: List[str] = Field(..., max_length=1000)
+
+
+class CategorizeResult(BaseModel):
+    categories: List[str]
+
+
+class BulkCategorizeRequest(BaseModel):
+    notes: List[Optional[str]] = Field(..., max_length=50000)
+
+
+# Category rule schemas
+class CategoryRuleBase(BaseModel):
+    keyword: str = Field(..., min_length=1)
+    category: str = Field(..., min_length=1)
+
+
+class CategoryRuleCreate(CategoryRuleBase):
+    pass
+
+
+class CategoryRule(CategoryRuleBase):
+    id: int
+    user_id: int
+
+    class Config:
+        orm_mode = True
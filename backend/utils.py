@@ -1,96 +1,281 @@
 import os
-import uuid
+import re
+import hashlib
+import tempfile
+import calendar
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
-import pytesseract
-from PIL import Image
-import io
+from typing import Optional, Tuple
 
 # Configure upload directory
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Uploads are read and written in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-async def save_upload_file(upload_file: UploadFile) -> str:
-    """Save an uploaded file and return the file path"""
-    # Generate a unique filename
-    filename = f"{uuid.uuid4()}_{upload_file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    # Save the file
-    with open(file_path, "wb") as f:
-        content = await upload_file.read()
-        f.write(content)
-    
-    return file_path
+# Larger uploads are rejected (HTTP 413)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
 
 
-def extract_text_from_image(file_path: str) -> str:
-    """Extract text from an image using OCR"""
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES"""
+
+
+# Leading bytes of the file types uploads are expected to be, and the
+# extension stored with them; anything else is stored without one
+UPLOAD_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"II*\x00", ".tif"),
+    (b"MM\x00*", ".tif"),
+    (b"BM", ".bmp"),
+    (b"%PDF-", ".pdf"),
+]
+
+
+def _upload_extension(head: bytes) -> str:
+    """Extension for a file judged by its first bytes, not the client's file
+    name, so the same content always gets the same path"""
+    for signature, extension in UPLOAD_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return ""
+
+
+async def save_upload_file(upload_file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """Save an uploaded file under its content hash and return the file path.
+
+    The upload is streamed to a temporary file in chunks while being hashed,
+    then moved to uploads/<h[0:2]>/<h[2:4]>/<sha256><ext>, with the extension
+    taken from the content's type.  A file with the same content is stored
+    once: if the path already exists the new copy is discarded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if not size:
+                    head = chunk[:16]
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+
+        content_hash = digest.hexdigest()
+        directory = os.path.join(UPLOAD_DIR, content_hash[:2], content_hash[2:4])
+        file_path = os.path.join(directory, content_hash + _upload_extension(head))
+        if os.path.exists(file_path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            # Atomic, so a concurrent upload of the same file can't expose a partial one
+            os.replace(temp_path, file_path)
+        return file_path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)"
+_YEAR = r"\d{4}|\d{2}"
+# The date, currency and keyword patterns open with a lookahead for the
+# characters a match can start with, which lets most positions fail before
+# any alternative is tried
+RECEIPT_DATE_RE = re.compile(
+    r"\b(?=[\da-z])(?:"
+    r"(?P<iso_year>\d{4})[-/.](?P<iso_month>\d{1,2})[-/.](?P<iso_day>\d{1,2})"  # 2026-10-12
+    rf"|(?P<first>\d{{1,2}})(?P<sep>[-/.])(?P<second>\d{{1,2}})[-/.](?P<year>{_YEAR})"  # 10/12/2026, 12.10.26
+    rf"|(?P<text_day>\d{{1,2}})\s+(?P<text_month>{_MONTH})[a-z]*\.?,?\s+(?P<text_year>{_YEAR})"  # 12 Oct 2026
+    rf"|(?P<month_first>{_MONTH})[a-z]*\.?\s+(?P<month_first_day>\d{{1,2}}),?\s+(?P<month_first_year>{_YEAR})"  # Oct 12, 2026
+    r")(?!\d)",
+    re.IGNORECASE,
+)
+MONTH_NUMBERS = {name: number for number, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1,
+)}
+# An amount needs a decimal part; earlier "." or "," are thousands separators.
+# The pattern starts with a digit so the regex engine can skip ahead to
+# candidates, which makes it several times faster than one starting with the
+# optional sign and currency symbol; those are picked up by _amount_start.
+# The lookarounds keep dotted dates such as 12.10.2026 from reading as 12.10
+_AMOUNT_PATTERN = r"\d(?<![\d.,/]\d)(?:{grouped}|\d*[.,]\d{{1,2}})(?!\d|[.,/]\d)"
+# (Non-breaking) spaces also group thousands, but "Widget 2 350.00" is a
+# quantity and a price and "Phone: 555 123.45" a number and a price, so on an
+# item line space grouping is only read before a decimal comma ("1 234,56")
+RECEIPT_AMOUNT_RE = re.compile(_AMOUNT_PATTERN.format(
+    grouped=r"\d{0,2}(?:[.,]\d{3})+[.,]\d{1,2}|\d{0,2}(?:[\u00a0\u202f ]\d{3})+,\d{1,2}"
+))
+# Total lines carry a single amount, so there "1 234.56" is one number
+RECEIPT_TOTAL_AMOUNT_RE = re.compile(_AMOUNT_PATTERN.format(
+    grouped=r"\d{0,2}(?:[.,\u00a0\u202f ]\d{3})+[.,]\d{1,2}"
+))
+RECEIPT_CURRENCY_RE = re.compile(r"(?=[$€£¥₹ACEGIJU])(?:[$€£¥₹]|\b(?:USD|EUR|GBP|INR|JPY|CAD|AUD|CHF)\b)")
+# Line labels, matched once per priced line against the lowercased line
+# (about twice as fast as IGNORECASE).  Alternatives sharing a start are
+# ordered longest first; "1" allows for OCR misreading "l"
+RECEIPT_KEYWORD_RE = re.compile(
+    r"\b(?=[a-z])(?:"
+    r"(?P<subtotal>sub[\s-]?tota[l1]|zwischensumme|sous[\s-]?total|netto)"
+    r"|(?P<grand_total>grand\s+tota[l1]|tota[l1]\s+due|amount\s+due|balance\s+due|tota[l1]\s+to\s+pay)"
+    r"|(?P<total>tota[l1]|gesamt|summe|montant|importe)"
+    r"|(?P<tax>tax|vat|[csi]?gst|hst|pst|iva|mwst|ust|tva)"
+    r"|(?P<included>incl?|including|inkl)"
+    # Payment and loyalty lines carry amounts but are not purchased items,
+    # and neither do "Phone: 555 123.45" style contact lines
+    r"|(?P<non_item>change|cash|tender(?:ed)?|card|visa|mastercard|amex|debit|credit|payment|paid|"
+    r"balance|tip|gratuity|discount|savings|saved|coupon|points|rounding|r[üu]ckgeld|karte|"
+    r"(?:phone|tel|fax)(?=\s*[:.]))"
+    r")\b"
+)
+# Labels of the lines read with RECEIPT_TOTAL_AMOUNT_RE
+TOTAL_LABELS = frozenset(("subtotal", "grand_total", "total"))
+RECEIPT_LETTERS_RE = re.compile(r"[^\W\d_]{2,}")
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+_THOUSANDS_SEPARATORS = str.maketrans("", "", ".,\u00a0\u202f ")
+
+
+def parse_amount(number: str) -> float:
+    """Convert "1.234,56" / "1,234.56" / "1 234,56" / "12,50" style numbers to float"""
+    split = max(number.rfind("."), number.rfind(","))
+    whole = number[:split]
+    if not whole.isdigit():
+        whole = whole.translate(_THOUSANDS_SEPARATORS)
+    return float(f"{whole}.{number[split + 1:]}")
+
+
+def _amount_start(line: str, start: int) -> Tuple[int, bool]:
+    """Start of the amount whose digits begin at start, taking in a currency
+    symbol and minus sign in front of them, and whether it is negative"""
+    if start and line[start - 1] in CURRENCY_SYMBOLS:
+        start -= 1
+    elif start > 1 and line[start - 1].isspace() and line[start - 2] in CURRENCY_SYMBOLS:
+        start -= 2
+    if start and line[start - 1] == "-":
+        return start - 1, True
+    return start, False
+
+
+def _receipt_date(match) -> Optional[datetime]:
+    """Build a date from a RECEIPT_DATE_RE match; None if it isn't a real date"""
+    groups = match.groupdict()
+    if groups["iso_year"]:
+        year, month, day = groups["iso_year"], groups["iso_month"], groups["iso_day"]
+    elif groups["first"]:
+        first, second = int(groups["first"]), int(groups["second"])
+        # Dotted dates are day-first in practice; otherwise month-first
+        # unless that can't be right
+        if groups["sep"] == "." or first > 12:
+            day, month = first, second
+        else:
+            month, day = first, second
+        year = groups["year"]
+    elif groups["text_month"]:
+        year, month, day = groups["text_year"], MONTH_NUMBERS[groups["text_month"].lower()], groups["text_day"]
+    else:
+        year, month, day = groups["month_first_year"], MONTH_NUMBERS[groups["month_first"].lower()], groups["month_first_day"]
+    year = int(year)
+    if year < 100:
+        year += 2000
     try:
-        image = Image.open(file_path)
-        text = pytesseract.image_to_string(image)
-        return text
-    except Exception as e:
-        print(f"Error extracting text from image: {e}")
-        return ""
+        return datetime(year, int(month), int(day))
+    except ValueError:
+        return None
 
 
 def parse_receipt_text(text: str) -> dict:
-    """Parse receipt text to extract amount, date, and merchant"""
-    # This is a simple implementation and might need to be improved
-    # for better accuracy in a production environment
-    lines = text.split('\n')
-    amount = None
-    date = None
+    """Parse OCR'd receipt text in a single pass over its lines.
+
+    Returns the total (as "amount"), subtotal, tax, currency, date, merchant
+    and the item lines that precede the totals.
+    """
     merchant = None
-    
-    # Try to find the total amount
-    for line in lines:
-        line = line.lower()
-        if 'total' in line and not amount:
-            # Extract numbers from the line
-            import re
-            numbers = re.findall(r'\d+\.\d+', line)
-            if numbers:
-                amount = float(numbers[-1])  # Assume the last number is the total
-    
-    # Try to find the date
-    for line in lines:
-        # Look for common date formats
-        import re
-        date_patterns = [
-            r'\d{1,2}/\d{1,2}/\d{2,4}',  # MM/DD/YYYY or DD/MM/YYYY
-            r'\d{1,2}-\d{1,2}-\d{2,4}',  # MM-DD-YYYY or DD-MM-YYYY
-            r'\d{1,2}\.\d{1,2}\.\d{2,4}'  # MM.DD.YYYY or DD.MM.YYYY
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, line)
-            if match and not date:
-                date_str = match.group(0)
-                try:
-                    # Try to parse the date
-                    from dateutil import parser
-                    date = parser.parse(date_str)
-                    break
-                except:
-                    continue
-    
-    # Try to find the merchant name (usually at the top of the receipt)
-    if lines and not merchant:
-        # Skip empty lines at the beginning
-        start_idx = 0
-        while start_idx < len(lines) and not lines[start_idx].strip():
-            start_idx += 1
-        
-        if start_idx < len(lines):
-            merchant = lines[start_idx].strip()
-    
+    date = None
+    currency = None
+    subtotal = None
+    tax = None
+    total = None
+    grand_total = None
+    items = []
+    in_items = True
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if date is None:
+            date_match = RECEIPT_DATE_RE.search(line)
+            if date_match:
+                date = _receipt_date(date_match)
+                line = line[:date_match.start()] + " " + line[date_match.end():]
+
+        if merchant is None:
+            if RECEIPT_LETTERS_RE.search(line):
+                merchant = raw_line.strip(" \t~*=-_|#.")
+            continue
+
+        if currency is None:
+            currency_match = RECEIPT_CURRENCY_RE.search(line)
+            if currency_match:
+                currency = CURRENCY_SYMBOLS.get(currency_match.group(0), currency_match.group(0))
+
+        price = None
+        for price in RECEIPT_AMOUNT_RE.finditer(line):
+            pass
+        if price is None:
+            continue
+        labels = {match.lastgroup for match in RECEIPT_KEYWORD_RE.finditer(line.lower())}
+        if not labels.isdisjoint(TOTAL_LABELS):
+            for price in RECEIPT_TOTAL_AMOUNT_RE.finditer(line):
+                pass
+        value = parse_amount(price.group())
+        price_start, negative = _amount_start(line, price.start())
+        if negative:
+            value = -value
+
+        if "subtotal" in labels:
+            subtotal = value
+            in_items = False
+        elif "grand_total" in labels:
+            grand_total = value if grand_total is None else grand_total
+            in_items = False
+        elif "tax" in labels and not ("total" in labels and "included" in labels):
+            tax = value if tax is None else round(tax + value, 2)
+            in_items = False
+        elif "total" in labels:
+            total = value if total is None else total
+            in_items = False
+        elif in_items and "non_item" not in labels:
+            description = " ".join((line[:price_start] + line[price.end():]).split()).strip(" .:-*@$€£¥₹")
+            if RECEIPT_LETTERS_RE.search(description):
+                items.append({"description": description, "amount": value})
+
+    amount = grand_total if grand_total is not None else total
+    if amount is None and subtotal is not None:
+        amount = round(subtotal + (tax or 0.0), 2)
+
     return {
         "amount": amount,
         "date": date.isoformat() if date else None,
-        "merchant": merchant
+        "merchant": merchant,
+        "subtotal": subtotal,
+        "tax": tax,
+        "currency": currency,
+        "items": items,
     }
 
 
@@ -103,4 +288,18 @@ def calculate_progress(current: float, target: float) -> float:
     """Calculate progress percentage"""
     if target == 0:
         return 0
-    return min(100, (current / target) * 100)
\ No newline at end of file
+    return min(100, (current / target) * 100)
+
+
+def month_start(value: datetime) -> datetime:
+    """Return midnight on the first day of the month containing value"""
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """Shift a datetime by whole calendar months, clamping the day to the target month"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)